@@ -0,0 +1,95 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from pydub import AudioSegment
+
+import gcpcache
+import gcptrace
+
+# Decoded PCM kept in memory across all packs
+AUDIO_CACHE_BYTES = 64 * 1024 * 1024
+# PCM a single pack may pre-decode before prefetching stops
+PREFETCH_BYTES = 32 * 1024 * 1024
+
+
+def decode_audio(data, mixer_format=None):
+    # Decode compressed deck audio (.m4a) to raw PCM. mixer_format is what
+    # pygame.mixer.get_init() returns, so the samples can be handed straight
+    # to pygame.mixer.Sound(buffer=...) without a WAV file in between.
+    with gcptrace.span('audio.decode', bytes=len(data), items=1):
+        sound = AudioSegment.from_file(io.BytesIO(data))
+        if mixer_format:
+            frequency, size, channels = mixer_format
+            sound = sound.set_frame_rate(frequency).set_channels(channels).set_sample_width(abs(size) // 8)
+        return sound.raw_data
+
+
+class AudioCache:
+    # Decoded sounds keyed by deck id and content hash, so a replaced sound is
+    # decoded again while a replay never is. Bounded by total PCM bytes.
+    def __init__(self, mixer_format=None, max_bytes=AUDIO_CACHE_BYTES):
+        self.mixer_format = mixer_format
+        self.memory = gcpcache.LRUCache(max_bytes, sizeof=len)
+
+    def key(self, deck_id, data):
+        return deck_id, gcpcache.content_hash(data)
+
+    def get(self, deck_id, data):
+        key = self.key(deck_id, data)
+        pcm = self.memory.get(key)
+        if pcm is None:
+            pcm = decode_audio(data, self.mixer_format)
+            self.memory.put(key, pcm)
+        return pcm
+
+
+class AudioPrefetcher:
+    # Pre-decodes a pack's sounds in worker processes once it has opened, so
+    # even the first click on a sound plays at once. Jobs go through the
+    # pack loader, which drops them when another pack is opened, and only a
+    # few are in flight at a time so visible rows (queued first) win and
+    # prefetching stops as soon as the PCM budget is spent.
+    def __init__(self, loader, cache, budget=PREFETCH_BYTES, max_workers=None):
+        self.loader = loader
+        self.cache = cache
+        self.budget = budget
+        self.max_workers = max_workers or min(2, os.cpu_count() or 1)
+        self.executor = None
+
+    def start(self, assets, deck_ids):
+        if self.executor is None:
+            # Spawned, not forked: the studio runs Tk, SDL's audio thread and
+            # loader threads, and a lock one of them holds at fork time
+            # would stay locked in the worker forever
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+        state = {'queue': list(deck_ids), 'bytes': 0}
+        for _ in range(self.max_workers):
+            self.submit_next(assets, state)
+
+    def submit_next(self, assets, state):
+        while state['queue'] and state['bytes'] < self.budget:
+            deck_id = state['queue'].pop(0)
+            data = assets.get('sound', deck_id)
+            if not data:
+                continue
+            key = self.cache.key(deck_id, data)
+            if key in self.cache.memory:
+                continue
+            # Views into the pack's memory map can't be pickled to a worker
+            self.loader.submit(
+                decode_audio, bytes(data), self.cache.mixer_format, executor=self.executor,
+                callback=lambda pcm, key=key: self.on_decoded(assets, state, key, pcm),
+                errback=lambda error: self.submit_next(assets, state))
+            return
+
+    def on_decoded(self, assets, state, key, pcm):
+        self.cache.memory.put(key, pcm)
+        state['bytes'] += len(pcm)
+        self.submit_next(assets, state)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,320 @@
+import argparse
+import functools
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import gcpcache
+import gcpcodec
+import gcpcore
+import gcpdownload
+import gcpgen
+import gcploader
+import gcppack
+
+try:
+    import resource
+except ImportError:
+    # Windows: no peak RSS
+    resource = None
+
+# Headless benchmarks for the slow paths of the studio:
+#   python gcpbench.py [--scales 10 100 1000] [--compare old.json]
+# Every stage of every pack runs in a fresh process so its peak RSS is its
+# own; it is reported above what the process held before the stage (the
+# interpreter and imports). Writes are those of the timed call.
+# Results are saved as JSON named after the current commit.
+
+PACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'packs')
+DEFAULT_SCALES = [10, 100]
+
+
+def timed(work_dir, func, *args):
+    # ({'seconds', 'bytes_written'}, result) of one call
+    written = bytes_written(work_dir)
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'bytes_written': bytes_written(work_dir) - written}, result
+
+
+def bench_open(path, work_dir, url):
+    # open_gcp's worker side: map the pack and index it
+    stats, (assets, decks) = timed(work_dir, gcploader.load_pack, path)
+    assets.close()
+    return {**stats, 'items': len(decks)}
+
+
+def bench_thumbnails(path, work_dir, url):
+    # update_tree_item_image: hash and render a thumbnail for every deck
+    # image, from a cold thumbnail cache
+    assets, decks = gcploader.load_pack(path)
+    thumbnails = gcpcache.ThumbnailCache(os.path.join(work_dir, 'thumbnails'))
+    stats, count = timed(work_dir, lambda: sum(gcploader.prepare_thumbnail(assets, thumbnails, deck['id']) is not None for deck in decks))
+    assets.close()
+    return {**stats, 'items': count}
+
+
+def bench_save(path, work_dir, url):
+    # save_gcp writing every member from memory
+    pack = gcpcore.load(path)
+    output_path = os.path.join(work_dir, 'saved.gcp')
+    stats, _ = timed(work_dir, gcpcore.save, pack, output_path)
+    return {**stats, 'items': len(pack.decks)}
+
+
+def bench_save_incremental(path, work_dir, url):
+    # save_gcp after editing one deck: the rest is copied from the pack
+    assets, decks = gcploader.load_pack(path)
+    pack = gcpcore.Pack(id=assets.reader.info.get('id', ''), name=assets.reader.info.get('name', ''))
+    for entry in decks:
+        pack.decks.append(gcpcore.Deck(id=entry['id'], name=entry['name'], color=entry['color'], unchanged=tuple(gcppack.LAYOUT)))
+    if pack.decks:
+        edited = pack.decks[0]
+        edited.unchanged = ('image', 'sound')
+        edited.load_json(json.loads(assets.get('deck', edited.id) or b'{}'))
+        edited.cards.append(gcpcore.Card(answer="Benchmark"))
+    output_path = os.path.join(work_dir, 'saved.gcp')
+    stats, _ = timed(work_dir, lambda: gcpcore.save(pack, output_path, source=assets.reader))
+    assets.close()
+    return {**stats, 'items': len(pack.decks)}
+
+
+def bench_pack(path, work_dir, url):
+    # compress_pack: build a .gcp from an unpacked folder
+    folder = os.path.join(work_dir, 'unpacked')
+    gcpcore.unpack(path, folder)
+    output_path = os.path.join(work_dir, 'packed.gcp')
+    stats, _ = timed(work_dir, gcppack.pack_folder, folder, output_path)
+    return {**stats, 'items': len(os.listdir(os.path.join(folder, 'deck')))}
+
+
+def bench_shift(path, work_dir, url):
+    # shift_bits: shift a whole file down and back up in place
+    copy_path = os.path.join(work_dir, 'shifted.gcp')
+    shutil.copyfile(path, copy_path)
+    stats, _ = timed(work_dir, lambda: (gcpcodec.shift_file(copy_path, False), gcpcodec.shift_file(copy_path, True)))
+    return {**stats, 'items': 2}
+
+
+def download(path, work_dir, url):
+    downloader = gcpdownload.PackDownloader(os.path.join(work_dir, 'downloads'))
+    try:
+        packstore = downloader.fetch_packstore(url)
+        pack = {'id': os.path.splitext(os.path.basename(path))[0]}
+        return timed(work_dir, downloader.download_pack, packstore, pack)
+    finally:
+        downloader.close()
+
+
+def bench_download(path, work_dir, url):
+    # download_selected_packs against the local server, nothing cached
+    stats, _ = download(path, work_dir, url)
+    return {**stats, 'items': 1}
+
+
+def bench_download_cached(path, work_dir, url):
+    # The same pack again: revalidated with the server, not refetched
+    download(path, work_dir, url)
+    stats, _ = download(path, work_dir, url)
+    return {**stats, 'items': 1}
+
+
+STAGES = {
+    'open': bench_open,
+    'thumbnails': bench_thumbnails,
+    'save': bench_save,
+    'save_incremental': bench_save_incremental,
+    'pack': bench_pack,
+    'shift': bench_shift,
+    'download': bench_download,
+    'download_cached': bench_download_cached,
+}
+
+
+def dir_size(folder):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names)
+
+
+def bytes_written(work_dir):
+    # Bytes this process has passed to write() so far (Linux; write_bytes
+    # would miss pages rewritten before they reach the disk); elsewhere the
+    # size of work_dir, which misses files rewritten in place
+    try:
+        with open('/proc/self/io') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('wchar:'))
+    except OSError:
+        return dir_size(work_dir)
+
+
+def peak_rss_mb():
+    # VmHWM on Linux, where ru_maxrss carries over the peak of the process
+    # that spawned this one
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(stage, path, work_dir, url):
+    baseline = peak_rss_mb()
+    result = STAGES[stage](path, work_dir, url)
+    result['peak_rss_mb'] = peak_rss_mb() - baseline if baseline is not None else None
+    return result
+
+
+def scale_pack(src_path, factor, dest_path):
+    # A pack with every deck of src_path repeated factor times
+    reader = gcppack.PackReader(src_path)
+    try:
+        info = reader.info
+        cards = []
+        with gcppack.PackWriter(dest_path) as writer:
+            for i in range(factor):
+                for card in info.get('cards', []):
+                    key, entry = next(iter(card.items()))
+                    deck_id = f"{entry['id']}_{i}"
+                    for kind in gcppack.LAYOUT:
+                        data = reader.read(kind, entry['id'])
+                        if data is not None:
+                            writer.add(kind, deck_id, data)
+                    cards.append({key: {**entry, 'id': deck_id}})
+            writer.write({**info, 'cards': cards})
+    finally:
+        reader.close()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(folder, handler=QuietHandler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(handler, directory=folder))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def commit_id():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(packs_dir=PACKS_DIR, scales=DEFAULT_SCALES, stages=None, base=None, repeat=1, synthetic=()):
+    stages = stages or list(STAGES)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='gcpbench-') as temp_dir:
+        # Shipped packs plus the base pack scaled up, all served locally
+        serve_dir = os.path.join(temp_dir, 'www')
+        os.makedirs(os.path.join(serve_dir, 'packs'))
+        packs = [(path, 1) for path in sorted(glob.glob(os.path.join(packs_dir, '*.gcp')))]
+        if scales:
+            base = base or max((path for path, _ in packs), key=os.path.getsize)
+        for factor in scales:
+            name = f"{os.path.splitext(os.path.basename(base))[0]}-x{factor}.gcp"
+            print(f"Generating {name}...", file=sys.stderr)
+            scale_pack(base, factor, os.path.join(serve_dir, 'packs', name))
+            packs.append((os.path.join(serve_dir, 'packs', name), factor))
+        for decks in synthetic:
+            # Many small decks, which scaling a shipped pack cannot reach
+            name = f"synthetic-{decks}.gcp"
+            print(f"Generating {name}...", file=sys.stderr)
+            gcpgen.generate(os.path.join(serve_dir, 'packs', name), decks)
+            packs.append((os.path.join(serve_dir, 'packs', name), decks))
+        for path, _ in packs:
+            target = os.path.join(serve_dir, 'packs', os.path.basename(path))
+            if not os.path.exists(target):
+                shutil.copyfile(path, target)
+        server = serve(serve_dir)
+        url = f"http://127.0.0.1:{server.server_address[1]}/packstore.json"
+        with open(os.path.join(serve_dir, 'packstore.json'), 'w') as f:
+            json.dump({'url': url, 'packs': []}, f)
+        context = multiprocessing.get_context('spawn')
+        try:
+            for path, factor in packs:
+                served_path = os.path.join(serve_dir, 'packs', os.path.basename(path))
+                for stage in stages:
+                    best = None
+                    for _ in range(repeat):
+                        work_dir = tempfile.mkdtemp(dir=temp_dir)
+                        # A fresh process per run so peak RSS belongs to this stage
+                        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                            result = executor.submit(run_stage, stage, served_path, work_dir, url).result()
+                        shutil.rmtree(work_dir, ignore_errors=True)
+                        if best is None or result['seconds'] < best['seconds']:
+                            best = result
+                    best.update(pack=os.path.basename(path), scale=factor, stage=stage, size=os.path.getsize(served_path))
+                    results.append(best)
+                    print(format_result(best), file=sys.stderr)
+        finally:
+            server.shutdown()
+    return results
+
+
+def format_result(result):
+    rss = f"+{result['peak_rss_mb']:6.1f} MB" if result['peak_rss_mb'] is not None else "      -   "
+    return (f"{result['pack']:<24} {result['stage']:<17} {result['seconds'] * 1000:10.1f} ms  "
+            f"peak {rss}  wrote {result['bytes_written'] / (1024 * 1024):8.2f} MB  {result['items']} items")
+
+
+def compare(old_results, new_results):
+    old = {(r['pack'], r['stage']): r for r in old_results}
+    for result in new_results:
+        before = old.get((result['pack'], result['stage']))
+        if before is None:
+            continue
+        ratio = result['seconds'] / max(before['seconds'], 1e-9)
+        print(f"{result['pack']:<24} {result['stage']:<17} {before['seconds'] * 1000:10.1f} -> {result['seconds'] * 1000:10.1f} ms  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GCP Studio's pack paths headless")
+    parser.add_argument('--packs', default=PACKS_DIR, help="Folder with the packs to benchmark")
+    parser.add_argument('--base', help="Pack to scale up (default: the largest)")
+    parser.add_argument('--scales', type=int, nargs='*', default=DEFAULT_SCALES, help="Scale factors for synthetic packs")
+    parser.add_argument('--synthetic', type=int, nargs='*', default=[], help="Deck counts of generated packs (gcpgen) to add")
+    parser.add_argument('--stages', nargs='*', choices=list(STAGES), help="Stages to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage; the fastest is kept")
+    parser.add_argument('-o', '--output', help="Results file (default: gcpbench-<commit>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    commit = commit_id()
+    results = run(args.packs, args.scales, args.stages, args.base, args.repeat, args.synthetic)
+    output = args.output or f"gcpbench-{commit or 'local'}.json"
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2)
+    print(f"Saved {len(results)} results to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f)['results'], results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
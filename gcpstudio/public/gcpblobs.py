@@ -0,0 +1,157 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+CHUNK_SIZE = 1024 * 1024
+# Blobs nothing else links to are pruned once they are this old (seconds)
+PRUNE_AGE = 7 * 24 * 3600
+
+
+class BlobStore:
+    # Files keyed by the SHA-256 of their content under root/<2 hex>/<hash>,
+    # so the same bytes are stored once however many packs or edits use
+    # them. Blobs are never modified once written. Files outside the store
+    # share a blob's storage through hard links (a copy where the file
+    # system has none), and every write goes to a temp file and is renamed
+    # into place, so readers never see a torn blob.
+    def __init__(self, root):
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def touch(self, digest):
+        # Recently used, so prune() keeps it. Linked blobs are left alone:
+        # their mtime is also that of every pack sharing them.
+        path = self.path(digest)
+        if os.stat(path).st_nlink < 2:
+            os.utime(path)
+
+    def temp_file(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        return os.fdopen(fd, 'wb'), temp_path
+
+    def commit(self, temp_path, digest):
+        # Move a finished temp file into place, or drop it if the content is
+        # already stored
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            self.touch(digest)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return digest
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if self.has(digest):
+            self.touch(digest)
+            return digest
+        f, temp_path = self.temp_file()
+        with f:
+            f.write(data)
+        return self.commit(temp_path, digest)
+
+    def put_file(self, file_path):
+        # Hash while copying, one chunk at a time
+        digest = hashlib.sha256()
+        f, temp_path = self.temp_file()
+        try:
+            with f, open(file_path, 'rb') as src:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return self.commit(temp_path, digest.hexdigest())
+
+    def read(self, digest):
+        with open(self.path(digest), 'rb') as f:
+            return f.read()
+
+    def adopt(self, file_path, digest=None):
+        # Take a file that is already on disk (a downloaded pack) into the
+        # store without copying it: it becomes a link to the blob with the
+        # same content, or the blob a link to it
+        digest = digest or file_digest(file_path)
+        path = self.path(digest)
+        if os.path.exists(path):
+            if not os.path.samefile(path, file_path):
+                self.link(digest, file_path)
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(file_path, path)
+        except OSError:
+            # No hard links here; the store keeps a copy instead
+            f, temp_path = self.temp_file()
+            f.close()
+            shutil.copyfile(file_path, temp_path)
+            os.replace(temp_path, path)
+        return digest
+
+    def link(self, digest, dest_path):
+        # Put the blob's content at dest_path, replacing what was there
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest_path)), suffix='.tmp')
+        os.close(fd)
+        os.remove(temp_path)
+        try:
+            os.link(self.path(digest), temp_path)
+        except OSError:
+            shutil.copyfile(self.path(digest), temp_path)
+        os.replace(temp_path, dest_path)
+        return dest_path
+
+    def usage(self):
+        # (blobs, bytes) held by the store
+        count = size = 0
+        for entry in self.blobs():
+            count += 1
+            size += entry.stat().st_size
+        return count, size
+
+    def blobs(self):
+        for shard in os.scandir(self.root):
+            if shard.is_dir():
+                yield from (entry for entry in os.scandir(shard.path) if entry.is_file())
+
+    def prune(self, max_age=PRUNE_AGE):
+        # Drop blobs no pack links to any more that have not been used for
+        # max_age seconds; returns the bytes freed
+        cutoff = time.time() - max_age
+        freed = 0
+        for entry in list(self.blobs()):
+            stat = entry.stat()
+            if stat.st_nlink < 2 and stat.st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                    freed += stat.st_size
+                except OSError:
+                    continue
+        return freed
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+if __name__ == "__main__":
+    # python gcpblobs.py STORE_DIR [prune]
+    store = BlobStore(sys.argv[1])
+    if sys.argv[2:] == ['prune']:
+        print(f"Freed {store.prune()} bytes")
+    count, size = store.usage()
+    print(f"{count} blobs, {size} bytes")
@@ -0,0 +1,146 @@
+import hashlib
+import io
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+THUMBNAIL_SIZE = (30, 30)
+THUMBNAIL_CACHE_ITEMS = 512
+# Images are reduced to this multiple of the thumbnail size before resampling
+REDUCE_GAP = 2
+# Modes Image.reduce handles; palette, bilevel and 16-bit images go
+# straight to resize
+REDUCE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'YCbCr', 'I', 'F')
+
+
+def app_data_dir():
+    base = os.getenv('APPDATA') or Path.home() / '.local' / 'share'
+    path = Path(base) / 'GCP Studio'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class LRUCache:
+    # Least-recently-used cache bounded by total size; sizeof defaults to
+    # counting entries, so max_size is then simply the number of items.
+    def __init__(self, max_size, sizeof=None):
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 1)
+        self.items = OrderedDict()
+        self.size = 0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.pop(key)
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return
+        self.items[key] = value
+        self.size += size
+        while self.size > self.max_size:
+            _, evicted = self.items.popitem(last=False)
+            self.size -= self.sizeof(evicted)
+
+    def pop(self, key):
+        if key in self.items:
+            value = self.items.pop(key)
+            self.size -= self.sizeof(value)
+            return value
+        return None
+
+    def clear(self):
+        self.items.clear()
+        self.size = 0
+
+
+def render_thumbnail(data, size=THUMBNAIL_SIZE):
+    image = Image.open(io.BytesIO(data))
+    # Formats that support it (JPEG) decode straight at a reduced scale
+    target = (size[0] * REDUCE_GAP, size[1] * REDUCE_GAP)
+    image.draft(None, target)
+
+    # Shrink by an integer factor first; a box reduce is far cheaper than
+    # running the resampling filter over the full-size pixels.
+    factor = min(image.width // target[0], image.height // target[1])
+    if factor > 1 and image.mode in REDUCE_MODES:
+        image = image.reduce(factor)
+
+    image = image.resize(size)
+    # PNG can't hold every mode (CMYK, PA, ...); 16-bit greyscale is scaled
+    # down first, as convert() would clip it
+    if image.mode.startswith('I'):
+        image = image.convert('I').point(lambda value: value / 256)
+    image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class ThumbnailCache:
+    # Thumbnails keyed by a hash of the source image. Rendered PNGs are kept
+    # on disk so reopening a pack never decodes the full-size image again,
+    # and the wrapped objects (e.g. Tk photos) live in a bounded LRU.
+    def __init__(self, cache_dir, size=THUMBNAIL_SIZE, max_items=THUMBNAIL_CACHE_ITEMS, wrap=None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = size
+        self.memory = LRUCache(max_items)
+        self.wrap = wrap or (lambda png: png)
+
+    def key(self, data):
+        return f"{content_hash(data)}-{self.size[0]}x{self.size[1]}"
+
+    def path(self, key):
+        return self.cache_dir / f"{key}.png"
+
+    def get(self, data):
+        return self.finish(*self.prepare(data))
+
+    def prepare(self, data):
+        # Hashing and rendering are safe to run on worker threads; only
+        # finish() wraps, which for Tk photos must happen on the Tk thread
+        key = self.key(data)
+        if key in self.memory:
+            return key, None
+        return key, self.load(key, data)
+
+    def finish(self, key, png):
+        thumbnail = self.memory.get(key)
+        if thumbnail is None:
+            if png is None:
+                png = self.path(key).read_bytes()
+            thumbnail = self.wrap(png)
+            self.memory.put(key, thumbnail)
+        return thumbnail
+
+    def load(self, key, data):
+        path = self.path(key)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            pass
+
+        png = render_thumbnail(data, self.size)
+        # Write to a side file first so a crash never leaves a torn thumbnail
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+            f.write(png)
+        os.replace(f.name, path)
+        return png
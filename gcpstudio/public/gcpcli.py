@@ -0,0 +1,165 @@
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import gcpcore
+import gcppack
+
+# Batch pack tool: python gcpcli.py <command> [options] PATH...
+# PATH may be a file or a folder; folders are searched for packs (or, for
+# the pack command, are a staged pack folder with an info.json or a folder
+# of them).
+
+
+def expand(paths, pattern):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            files.append(path)
+    return files
+
+
+def is_pack_folder(path):
+    return os.path.isfile(os.path.join(path, 'info.json'))
+
+
+def pack_name(path):
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def unpack_job(path, output_dir, compression, version):
+    folder = os.path.join(output_dir, pack_name(path))
+    gcpcore.unpack(path, folder)
+    return os.path.getsize(path), folder
+
+
+def pack_job(folder, output_dir, compression, version):
+    output_path = os.path.join(output_dir, pack_name(folder) + ".gcp")
+    gcppack.pack_folder(folder, output_path, compression, version)
+    return os.path.getsize(output_path), output_path
+
+
+def validate_job(path, output_dir, compression, version):
+    problems = gcpcore.validate(gcpcore.load(path))
+    return os.path.getsize(path), "; ".join(problems) if problems else "ok"
+
+
+def recompress_job(path, output_dir, compression, version):
+    output_path = os.path.join(output_dir, os.path.basename(path)) if output_dir else path
+    size = os.path.getsize(path)
+    gcpcore.save(gcpcore.load(path), output_path, compression, version)
+    return size, f"{size} -> {os.path.getsize(output_path)} bytes"
+
+
+def stats_job(path, output_dir, compression, version):
+    pack = gcpcore.load(path)
+    cards = sum(len(deck.cards) for deck in pack.decks)
+    images = sum(len(deck.image or b'') for deck in pack.decks)
+    sounds = sum(len(deck.sound or b'') for deck in pack.decks)
+    return os.path.getsize(path), f"{len(pack.decks)} decks, {cards} cards, {images} image bytes, {sounds} sound bytes"
+
+
+def convert_job(path, output_dir, compression, version):
+    output_path = os.path.join(output_dir, os.path.basename(path)) if output_dir else path
+    gcppack.convert(path, output_path, version, compression)
+    return os.path.getsize(path), f"layout {version} -> {output_path}"
+
+
+def compression_job(path, output_dir, compression, version):
+    # Size against encode (save) and decode (load) time for every preset
+    pack = gcpcore.load(path)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for preset in gcppack.COMPRESSION:
+            output_path = os.path.join(temp_dir, preset + ".gcp")
+            start = time.perf_counter()
+            gcpcore.save(pack, output_path, preset, version)
+            encode = time.perf_counter() - start
+            start = time.perf_counter()
+            gcpcore.load(output_path)
+            decode = time.perf_counter() - start
+            results.append(f"{preset} {os.path.getsize(output_path)} bytes {encode:.3f}/{decode:.3f} s")
+    return os.path.getsize(path), "; ".join(results)
+
+
+COMMANDS = {
+    'unpack': (unpack_job, "*.gcp", "Extract packs to info.json + deck/image/sound folders"),
+    'pack': (pack_job, "*", "Build packs from unpacked folders"),
+    'validate': (validate_job, "*.gcp", "Check packs for missing or malformed decks"),
+    'recompress': (recompress_job, "*.gcp", "Rewrite packs through the current writer"),
+    'stats': (stats_job, "*.gcp", "Report deck, card and asset counts"),
+    'convert': (convert_job, "*.gcp", "Rewrite packs in another layout (--layout), copying members as-is"),
+    'compression': (compression_job, "*.gcp", "Compare size and save/load time of each compression preset"),
+}
+
+
+def timed(job, path, output_dir, compression, version):
+    start = time.perf_counter()
+    try:
+        size, detail = job(path, output_dir, compression, version)
+        failed = False
+    except Exception as e:
+        size, detail, failed = 0, f"error: {e}", True
+    return path, size, time.perf_counter() - start, detail, failed
+
+
+def run(command, paths, output_dir=None, workers=None, compression=gcppack.DEFAULT_COMPRESSION, version=gcppack.FORMAT_VERSION):
+    job, pattern, _ = COMMANDS[command]
+    if command == 'pack':
+        # A folder with an info.json is a staged pack; any other folder is
+        # searched for staged packs
+        folders = []
+        for path in paths:
+            folders.extend([path] if is_pack_folder(path) else expand([path], pattern))
+        paths = [path for path in folders if is_pack_folder(path)]
+    else:
+        paths = expand(paths, pattern)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    elif command in ('unpack', 'pack'):
+        output_dir = '.'
+
+    start = time.perf_counter()
+    total_bytes = 0
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(timed, job, path, output_dir, compression, version) for path in paths]
+        for future in as_completed(futures):
+            path, size, seconds, detail, failed = future.result()
+            total_bytes += size
+            failures += failed or (command == 'validate' and detail != "ok")
+            mb = size / (1024 * 1024)
+            print(f"{path}  {mb:8.2f} MB  {seconds:7.3f} s  {mb / max(seconds, 1e-9):8.1f} MB/s  {detail}")
+
+    elapsed = time.perf_counter() - start
+    mb = total_bytes / (1024 * 1024)
+    print(f"{len(paths)} packs, {mb:.2f} MB in {elapsed:.3f} s ({mb / max(elapsed, 1e-9):.1f} MB/s), {failures} failed")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch tools for GCP Studio packs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (_, _, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument('paths', nargs='+')
+        subparser.add_argument('-o', '--output', help="Output folder (recompress rewrites in place without one)")
+        subparser.add_argument('-j', '--jobs', type=int, default=None, help="Worker processes (default: CPU count)")
+        subparser.add_argument(
+            '-c', '--compression', choices=list(gcppack.COMPRESSION), default=gcppack.DEFAULT_COMPRESSION,
+            help=f"Compression preset for written packs (default: {gcppack.DEFAULT_COMPRESSION})")
+        subparser.add_argument(
+            '--layout', type=int, choices=[1, 2], default=2 if name == 'convert' else gcppack.FORMAT_VERSION,
+            help="Layout of written packs: 1 nested archives, 2 flat with a manifest")
+    args = parser.parse_args(argv)
+    return run(args.command, args.paths, args.output, args.jobs, args.compression, args.layout)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+
+import gcppack
+import gcptrace
+
+# Headless pack model: everything here works without a display and without
+# importing tkinter, customtkinter or pygame, so packs can be processed in
+# batch jobs and the I/O paths benchmarked on CI.
+
+
+@dataclass
+class Card:
+    answer: str = ''
+    hints: list = field(default_factory=lambda: ['', '', ''])
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(answer=data.get('answer', ''), hints=list(data.get('hints', [])))
+
+    def to_json(self):
+        return {"answer": self.answer, "hints": list(self.hints)}
+
+
+@dataclass
+class Deck:
+    id: str
+    name: str
+    color: str
+    cards: list = field(default_factory=list)
+    image: bytes = None
+    sound: bytes = None
+    # info.json files key each deck entry by a color slot; defaults to color
+    key: str = None
+    # Fields of the deck's own JSON besides its cards (name, color, ...)
+    meta: dict = None
+    # Kinds ('deck', 'image', 'sound') save() copies from the source pack
+    # as they are instead of writing the fields above
+    unchanged: tuple = ()
+    # Files save() streams a kind from instead, e.g. blobs of edited assets
+    files: dict = field(default_factory=dict)
+
+    def load_json(self, data):
+        self.meta = {k: v for k, v in data.items() if k != 'cards'}
+        self.cards = [Card.from_json(card) for card in data.get('cards', [])]
+
+    def to_json(self):
+        meta = self.meta if self.meta is not None else {"name": self.name, "color": self.color}
+        return {**meta, "cards": [card.to_json() for card in self.cards]}
+
+    def info_entry(self):
+        return {self.key or self.color: {"id": self.id, "name": self.name, "color": self.color}}
+
+
+@dataclass
+class Pack:
+    id: str
+    name: str
+    decks: list = field(default_factory=list)
+
+    def info(self):
+        return {"id": self.id, "name": self.name, "cards": [deck.info_entry() for deck in self.decks]}
+
+    def deck(self, deck_id):
+        for deck in self.decks:
+            if deck.id == deck_id:
+                return deck
+        return None
+
+
+def png(width, height, rows):
+    # An 8-bit RGB PNG built without PIL; rows are the scanlines, each
+    # already prefixed with its filter byte
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(bytes(rows))) + chunk(b'IEND', b'')
+
+
+def blank_png(color=(255, 255, 255)):
+    # 1x1 placeholder image for decks saved without one
+    return png(1, 1, b'\x00' + bytes(color))
+
+
+def load(file_path):
+    reader = gcppack.PackReader(file_path)
+    try:
+        with gcptrace.span('pack.load', bytes=os.path.getsize(file_path)) as trace:
+            info = reader.info
+            pack = Pack(id=info.get('id', ''), name=info.get('name', ''))
+            for card in info.get('cards', []):
+                key, entry = next(iter(card.items()))
+                deck_id = entry['id']
+                deck = Deck(
+                    id=deck_id, name=entry.get('name', ''), color=entry.get('color', ''), key=key,
+                    image=reader.read('image', deck_id), sound=reader.read('sound', deck_id))
+                data = reader.read('deck', deck_id)
+                if data is not None:
+                    deck.load_json(json.loads(data))
+                pack.decks.append(deck)
+            trace.add(items=len(pack.decks))
+        return pack
+    finally:
+        reader.close()
+
+
+def save(pack, file_path, compression=gcppack.DEFAULT_COMPRESSION, version=gcppack.FORMAT_VERSION, source=None):
+    # source is the PackReader the pack was loaded from; members a deck
+    # lists as unchanged are copied from it without being decoded
+    with gcptrace.span('pack.save', items=len(pack.decks)) as trace, \
+            gcppack.PackWriter(file_path, compression=compression, version=version) as writer:
+        # Inner archives nothing was added to, removed from or changed in
+        # are taken over whole
+        whole = set()
+        if source is not None:
+            deck_ids = sorted(deck.id for deck in pack.decks)
+            for kind in gcppack.LAYOUT:
+                if (all(kind in deck.unchanged for deck in pack.decks) and deck_ids == sorted(source.ids(kind))
+                        and writer.copy_archive(source, kind)):
+                    whole.add(kind)
+
+        for deck in pack.decks:
+            members = {
+                'deck': lambda: json.dumps(deck.to_json(), indent=2).encode(),
+                'image': lambda: deck.image if deck.image is not None else blank_png(),
+                'sound': lambda: deck.sound if deck.sound is not None else b'',  # Empty placeholder
+            }
+            for kind, data in members.items():
+                if kind in whole:
+                    continue
+                if source is not None and kind in deck.unchanged and source.has(kind, deck.id):
+                    writer.copy_from(source, kind, deck.id)
+                elif kind in deck.files:
+                    writer.add_file(kind, deck.id, deck.files[kind])
+                else:
+                    writer.add(kind, deck.id, data())
+        writer.write(pack.info())
+        trace.add(bytes=os.path.getsize(file_path))
+
+
+def unpack(file_path, folder_path):
+    # Write the staging layout pack_folder()/compress_pack consume:
+    # info.json plus deck/*.json, image/*.png and sound/*.m4a
+    reader = gcppack.PackReader(file_path)
+    try:
+        with gcptrace.span('pack.unpack', bytes=os.path.getsize(file_path)) as trace:
+            os.makedirs(folder_path, exist_ok=True)
+            with open(os.path.join(folder_path, "info.json"), 'wb') as f:
+                f.write(reader.zipf.read('info.json'))
+            for kind, (_, _, asset_ext) in gcppack.LAYOUT.items():
+                kind_path = os.path.join(folder_path, kind)
+                os.makedirs(kind_path, exist_ok=True)
+                for deck_id in reader.ids(kind):
+                    with open(os.path.join(kind_path, deck_id + asset_ext), 'wb') as f:
+                        f.write(reader.read(kind, deck_id) if kind == 'deck' else reader.view(kind, deck_id))
+                    trace.add(items=1)
+    finally:
+        reader.close()
+
+
+def validate(pack):
+    problems = []
+    if not pack.id:
+        problems.append("Pack ID is required")
+    if not pack.name:
+        problems.append("Pack Name is required")
+
+    seen = set()
+    for deck in pack.decks:
+        if not deck.id or not deck.name or not deck.color:
+            problems.append(f"Deck {deck.id} is missing required fields (ID, Name, or Color)")
+        if deck.id in seen:
+            problems.append(f"Deck {deck.id} is listed more than once")
+        seen.add(deck.id)
+        if deck.meta is None:
+            problems.append(f"Deck {deck.id} has no deck file")
+        if deck.image is None:
+            problems.append(f"Deck {deck.id} has no image")
+        for i, card in enumerate(deck.cards):
+            if not card.answer:
+                problems.append(f"Deck {deck.id} card {i + 1} has no answer")
+    return problems
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import gcpblobs
+import gcptrace
+
+# Packs fetched at the same time
+MAX_WORKERS = 4
+CHUNK_SIZE = 64 * 1024
+TIMEOUT = 30
+# Times an interrupted download is resumed before giving up
+RETRIES = 3
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+def make_session(max_workers=MAX_WORKERS):
+    # One pooled session so parallel downloads reuse their connections
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def pack_url(packstore, pack_id):
+    base_url = packstore['url'].rsplit('/', 1)[0]
+    return f"{base_url}/packs/{pack_id}.gcp"
+
+
+class DownloadCache:
+    # Validators (ETag/Last-Modified) and the content hash of every file we
+    # have downloaded, keyed by URL and persisted as JSON in the app data dir
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'downloads.json')
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def conditional_headers(self, url, dest_path):
+        # Only revalidate when the local copy is still exactly what we fetched
+        entry = self.entries.get(url)
+        if not entry or not os.path.exists(dest_path):
+            return {}
+        if os.path.getsize(dest_path) != entry.get('size') or gcpblobs.file_digest(dest_path) != entry.get('sha256'):
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, response, sha256, size):
+        with self.lock:
+            self.entries[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'sha256': sha256,
+                'size': size,
+            }
+            self.save()
+
+    def partial_validator(self, url):
+        # The ETag/Last-Modified a .part file was started from, for If-Range
+        return self.entries.get(url, {}).get('partial')
+
+    def set_partial(self, url, response):
+        with self.lock:
+            entry = self.entries.setdefault(url, {})
+            entry['partial'] = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            self.save()
+
+    def save(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+def download_file(session, url, dest_path, progress=None, cache=None, size=None, sha256=None, cancel=None):
+    # Stream the body to dest_path + '.part' and rename it into place once it
+    # is complete and verified, so a failed download never leaves a torn
+    # pack. An interrupted download resumes from the .part with a Range
+    # request. With a cache, unchanged files come back as 304. Setting the
+    # cancel event stops it between chunks, keeping the .part to resume.
+    if sha256 and os.path.exists(dest_path) and gcpblobs.file_digest(dest_path) == sha256:
+        # The local copy already matches the manifest; nothing to fetch
+        if progress:
+            progress(os.path.getsize(dest_path), os.path.getsize(dest_path))
+        return dest_path
+
+    part_path = dest_path + '.part'
+    with gcptrace.span('download.file', url=url, items=1) as trace:
+        for attempt in range(RETRIES + 1):
+            try:
+                dest_path = fetch_part(session, url, dest_path, part_path, progress, cache, size, sha256, cancel)
+                trace.add(bytes=os.path.getsize(dest_path), attempts=attempt + 1)
+                return dest_path
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                if attempt == RETRIES:
+                    raise
+
+
+def fetch_part(session, url, dest_path, part_path, progress, cache, size, sha256, cancel):
+    headers = cache.conditional_headers(url, dest_path) if cache else {}
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+        validator = cache.partial_validator(url) if cache else None
+        if validator:
+            headers['If-Range'] = validator
+
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code == 304:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            if progress:
+                progress(os.path.getsize(dest_path), os.path.getsize(dest_path))
+            return dest_path
+
+        if response.status_code == 416:
+            # The .part no longer lines up with the file on the server
+            os.remove(part_path)
+            raise requests.ConnectionError(f"Stale partial download for {url}")
+
+        response.raise_for_status()
+        if response.status_code == 206:
+            mode = 'ab'
+        else:
+            # The server sent the whole file (no range support, or it changed)
+            offset = 0
+            mode = 'wb'
+            if cache:
+                cache.set_partial(url, response)
+
+        done = offset
+        total = offset + int(response.headers.get('Content-Length', 0))
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if cancel is not None and cancel.is_set():
+                    raise DownloadCancelled(url)
+                f.write(chunk)
+                done += len(chunk)
+                if progress:
+                    progress(done, total)
+
+    digest = gcpblobs.file_digest(part_path)
+    if (size is not None and done != size) or (sha256 and digest != sha256):
+        os.remove(part_path)
+        raise ValueError(f"Downloaded file failed verification: {url}")
+
+    os.replace(part_path, dest_path)
+    if cache:
+        cache.put(url, response, digest, done)
+    return dest_path
+
+
+def manifest_entry(path):
+    # Size and hash fields a packstore entry can carry for verification
+    return {'size': os.path.getsize(path), 'sha256': gcpblobs.file_digest(path)}
+
+
+class PackDownloader:
+    # Downloaded packs are taken into the blob store, so a pack whose
+    # content is already there (the same pack under another id or from
+    # another packstore) is linked to it instead of stored again, and one
+    # the manifest hashes is not fetched at all
+    def __init__(self, dest_dir, max_workers=MAX_WORKERS, session=None, blobs=None):
+        self.dest_dir = dest_dir
+        self.max_workers = max_workers
+        self.session = session or make_session(max_workers)
+        self.cache = DownloadCache(os.path.join(dest_dir, 'cache'))
+        self.blobs = blobs or gcpblobs.BlobStore(os.path.join(dest_dir, 'blobs'))
+        self.cancelled = threading.Event()
+
+    def pack_path(self, pack_id):
+        return os.path.join(self.dest_dir, f"{pack_id}.gcp")
+
+    def fetch_packstore(self, url):
+        # Keep the last packstore.json so a 304 can be answered locally
+        name = hashlib.sha256(url.encode()).hexdigest()[:16]
+        path = download_file(self.session, url, os.path.join(self.cache.cache_dir, f"packstore-{name}.json"), cache=self.cache)
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def download_pack(self, packstore, pack, progress=None):
+        url = pack_url(packstore, pack['id'])
+        dest_path = self.pack_path(pack['id'])
+        sha256 = pack.get('sha256')
+        if sha256 and self.blobs.has(sha256):
+            if not (os.path.exists(dest_path) and os.path.samefile(dest_path, self.blobs.path(sha256))):
+                self.blobs.link(sha256, dest_path)
+            if progress:
+                progress(os.path.getsize(dest_path), os.path.getsize(dest_path))
+            return dest_path
+        dest_path = download_file(self.session, url, dest_path, progress, self.cache, pack.get('size'), sha256, self.cancelled)
+        self.blobs.adopt(dest_path, sha256 or self.cache.entries.get(url, {}).get('sha256'))
+        return dest_path
+
+    def close(self):
+        # Stops downloads in flight too
+        self.cancelled.set()
+        self.session.close()
+
+
+def stale_packs(packstore_path):
+    # Ids of the packs whose size/sha256 in packstore.json no longer match
+    # the file in the packs/ folder next to it. Clients reject a pack that
+    # fails these, so every change to packs/ has to refresh the manifest.
+    with open(packstore_path, 'r') as f:
+        packstore = json.load(f)
+    packs_dir = os.path.join(os.path.dirname(os.path.abspath(packstore_path)), 'packs')
+    stale = []
+    for pack in packstore['packs']:
+        if not {'size', 'sha256'} & pack.keys():
+            continue
+        entry = manifest_entry(os.path.join(packs_dir, f"{pack['id']}.gcp"))
+        if any(pack.get(key, entry[key]) != entry[key] for key in entry):
+            stale.append(pack['id'])
+    return stale
+
+
+if __name__ == "__main__":
+    # Refresh the size/sha256 of every pack listed in a packstore.json from
+    # the packs/ folder next to it: python gcpdownload.py packstore.json
+    # With --check, only report packs whose entries are out of date.
+    packstore_path = sys.argv[1]
+    if sys.argv[2:] == ['--check']:
+        stale = stale_packs(packstore_path)
+        for pack_id in stale:
+            print(f"{pack_id}: size/sha256 out of date, run python gcpdownload.py {packstore_path}")
+        sys.exit(1 if stale else 0)
+    with open(packstore_path, 'r') as f:
+        packstore = json.load(f)
+    packs_dir = os.path.join(os.path.dirname(os.path.abspath(packstore_path)), 'packs')
+    for pack in packstore['packs']:
+        pack.update(manifest_entry(os.path.join(packs_dir, f"{pack['id']}.gcp")))
+    with open(packstore_path, 'w') as f:
+        json.dump(packstore, f, indent=2)
@@ -0,0 +1,121 @@
+import tkinter as tk
+from tkinter import ttk
+
+# Hint entries every row has at least (new cards get this many)
+HINT_COUNT = 3
+
+
+class CardList:
+    # Virtualized card list for the deck editor: widgets exist only for the
+    # rows on screen and are rebound to other cards as the canvas scrolls,
+    # so a deck with thousands of cards opens as fast as a small one. Edits
+    # are flushed from a row into self.cards, the backing list, whenever
+    # the row is rebound or the cards are read.
+    def __init__(self, master, cards):
+        self.cards = [{"answer": card.get('answer', ''), "hints": list(card.get('hints', []))} for card in cards]
+        self.hint_count = max([len(card['hints']) for card in self.cards] + [HINT_COUNT])
+        self.rows = []
+        self.row_height = None
+        self.region = None
+
+        self.canvas = tk.Canvas(master, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(master, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.on_scroll, yscrollincrement=1)
+        self.canvas.bind('<Configure>', lambda e: self.refresh())
+
+    def make_row(self):
+        frame = ttk.Frame(self.canvas)
+        row = {'frame': frame, 'index': None, 'answer': tk.StringVar(), 'hints': [], 'entries': []}
+
+        card_frame = ttk.Frame(frame)
+        card_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(card_frame, text="Answer:").pack(side=tk.LEFT)
+        ttk.Entry(card_frame, textvariable=row['answer']).pack(side=tk.LEFT, expand=True, fill=tk.X)
+
+        hints_frame = ttk.Frame(frame)
+        hints_frame.pack(fill=tk.X, padx=5, pady=5)
+        for i in range(self.hint_count):
+            var = tk.StringVar()
+            ttk.Label(hints_frame, text=f"Hint {i+1}:").grid(row=i, column=0, sticky=tk.W)
+            entry = ttk.Entry(hints_frame, textvariable=var)
+            entry.grid(row=i, column=1, sticky=tk.EW)
+            row['hints'].append(var)
+            row['entries'].append(entry)
+        hints_frame.grid_columnconfigure(1, weight=1)
+
+        row['window'] = self.canvas.create_window(0, 0, window=frame, anchor="nw")
+        if self.row_height is None:
+            frame.update_idletasks()
+            self.row_height = frame.winfo_reqheight()
+            self.update_scrollregion()
+        self.hide_row(row)
+        self.rows.append(row)
+        return row
+
+    def update_scrollregion(self):
+        # Only on change: the canvas calls on_scroll again after every update
+        region = (0, 0, self.canvas.winfo_width(), len(self.cards) * self.row_height)
+        if region != self.region:
+            self.region = region
+            self.canvas.configure(scrollregion=region)
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def refresh(self):
+        if self.row_height is None:
+            self.make_row()
+        self.update_scrollregion()
+        top = int(self.canvas.canvasy(0))
+        first = top // self.row_height
+        last = min(len(self.cards), (top + self.canvas.winfo_height()) // self.row_height + 1)
+        visible = range(first, last)
+
+        bound = {row['index']: row for row in self.rows if row['index'] in visible}
+        free = [row for row in self.rows if row['index'] not in visible]
+        for index in visible:
+            if index in bound:
+                continue
+            row = free.pop() if free else self.make_row()
+            self.flush_row(row)
+            self.bind_row(row, index)
+        for row in free:
+            self.flush_row(row)
+            row['index'] = None
+            self.hide_row(row)
+
+        width = self.canvas.winfo_width()
+        for row in self.rows:
+            self.canvas.itemconfigure(row['window'], width=width)
+
+    def bind_row(self, row, index):
+        card = self.cards[index]
+        row['index'] = index
+        row['answer'].set(card['answer'])
+        for i, (var, entry) in enumerate(zip(row['hints'], row['entries'])):
+            # Cards keep exactly the hints they had; extra entries are idle
+            var.set(card['hints'][i] if i < len(card['hints']) else '')
+            entry.configure(state='normal' if i < len(card['hints']) else 'disabled')
+        self.canvas.coords(row['window'], 0, index * self.row_height)
+
+    def hide_row(self, row):
+        # Scrollregion starts at 0, so this is never on screen
+        self.canvas.coords(row['window'], 0, -2 * self.row_height)
+
+    def flush_row(self, row):
+        if row['index'] is None:
+            return
+        card = self.cards[row['index']]
+        card['answer'] = row['answer'].get()
+        card['hints'] = [var.get() for var in row['hints'][:len(card['hints'])]]
+
+    def add_card(self, answer="", hints=None):
+        self.cards.append({"answer": answer, "hints": list(hints) if hints is not None else [''] * HINT_COUNT})
+        self.refresh()
+        self.canvas.yview_moveto(1)
+
+    def get_cards(self):
+        for row in self.rows:
+            self.flush_row(row)
+        return self.cards
@@ -0,0 +1,149 @@
+import argparse
+import io
+import json
+import math
+import os
+import random
+import shutil
+import struct
+import sys
+import time
+import wave
+
+import gcpcore
+import gcppack
+
+# Synthetic packs for scale testing, in the same layout the studio and the
+# game read:
+#   python gcpgen.py big.gcp --decks 10000 --cards 10 --image 256x256 --sound 2
+# Every deck gets its own image so thumbnail caching cannot hide the cost
+# (they compress to almost nothing, decoding still scales with resolution);
+# sounds cycle through a few tones since encoding them is the slow part.
+
+# Deck colors as the shipped packs name them (info.json key, deck color)
+COLORS = [
+    ('red', 'red-500'), ('blue', 'blue-500'), ('yellow', 'yellow'), ('indigo', 'indigo'),
+    ('green', 'green-500'), ('purple', 'purple-500'), ('orange', 'orange-500'), ('pink', 'pink-500'),
+]
+# Distinct sounds in a pack
+TONES = 8
+SAMPLE_RATE = 22050
+WORDS = (
+    "apple river castle planet guitar window mountain rocket garden silver ocean lantern "
+    "dragon pencil thunder candle island marble forest violin desert comet harbor meadow "
+    "puzzle jungle canyon falcon glacier volcano orchard galaxy tiger bridge crystal"
+).split()
+
+
+def png(width, height, seed):
+    # A gradient that differs per seed
+    def green(y):
+        return (y * 255 // max(height - 1, 1) + seed * 3) & 255
+
+    first = bytearray(width * 3)
+    first[0::3] = bytes((x * 255 // max(width - 1, 1) + seed) & 255 for x in range(width))
+    first[1::3] = bytes([green(0)]) * width
+    first[2::3] = bytes([(seed * 7) & 255]) * width
+    # Later rows use PNG's "up" filter: only green changes between rows
+    rows = bytearray(b'\x00' + first)
+    for y in range(1, height):
+        row = bytearray(width * 3)
+        row[1::3] = bytes([(green(y) - green(y - 1)) & 255]) * width
+        rows += b'\x02' + row
+    return gcpcore.png(width, height, rows)
+
+
+def tone_wav(seconds, frequency):
+    samples = int(seconds * SAMPLE_RATE)
+    frames = struct.pack(f'<{samples}h', *(int(12000 * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE)) for i in range(samples)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(frames)
+    return buffer.getvalue()
+
+
+def tone(seconds, frequency, sound_format):
+    data = tone_wav(seconds, frequency)
+    if sound_format == 'wav':
+        return data
+    # m4a like real packs; needs pydub and ffmpeg
+    from pydub import AudioSegment
+    output = io.BytesIO()
+    AudioSegment.from_wav(io.BytesIO(data)).export(output, format='ipod')
+    return output.getvalue()
+
+
+def default_sound_format():
+    return 'm4a' if shutil.which('ffmpeg') else 'wav'
+
+
+def card(rng, deck_index, card_index, hint_count):
+    words = rng.sample(WORDS, 3)
+    return {
+        "hints": [f"Hint {i + 1} for card {card_index + 1} of deck {deck_index + 1}: {' '.join(rng.sample(WORDS, 4))}" for i in range(hint_count)],
+        "answer": f"{words[0].title()} {words[1]} {card_index + 1}",
+    }
+
+
+def generate(output_path, decks=10000, cards=10, image_size=(256, 256), sound_seconds=2.0,
+             hints=3, sound_format=None, compression=gcppack.DEFAULT_COMPRESSION,
+             version=gcppack.FORMAT_VERSION, seed=0):
+    rng = random.Random(seed)
+    sound_format = sound_format or default_sound_format()
+    sounds = [tone(sound_seconds, 220 * 2 ** (i / 12), sound_format) for i in range(TONES)] if sound_seconds > 0 else None
+    entries = []
+    with gcppack.PackWriter(output_path, compression=compression, version=version) as writer:
+        for i in range(decks):
+            key, color = COLORS[i % len(COLORS)]
+            deck_id = f"deck_{i:05d}"
+            name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i + 1}"
+            deck = {"id": deck_id, "name": name, "color": color,
+                    "cards": [card(rng, i, j, hints) for j in range(cards)]}
+            writer.add('deck', deck_id, json.dumps(deck, indent=2).encode())
+            writer.add('image', deck_id, png(image_size[0], image_size[1], i))
+            if sounds is not None:
+                writer.add('sound', deck_id, sounds[i % len(sounds)])
+            entries.append({key: {"id": deck_id, "name": name, "color": color}})
+        pack_id = os.path.splitext(os.path.basename(output_path))[0]
+        writer.write({"id": pack_id, "name": f"Synthetic {decks} decks", "cards": entries})
+    return output_path
+
+
+def image_size(text):
+    try:
+        width, height = (int(part) for part in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    return width, height
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic pack for scale testing")
+    parser.add_argument('output', help="Pack to write")
+    parser.add_argument('--decks', type=int, default=10000)
+    parser.add_argument('--cards', type=int, default=10, help="Cards per deck")
+    parser.add_argument('--hints', type=int, default=3, help="Hints per card")
+    parser.add_argument('--image', type=image_size, default=(256, 256), help="Image resolution, WIDTHxHEIGHT")
+    parser.add_argument('--sound', type=float, default=2.0, help="Sound length in seconds (0 for no sounds)")
+    parser.add_argument('--sound-format', choices=['m4a', 'wav'], help="Sound encoding (default: m4a when ffmpeg is installed)")
+    parser.add_argument(
+        '-c', '--compression', choices=list(gcppack.COMPRESSION), default=gcppack.DEFAULT_COMPRESSION,
+        help=f"Compression preset (default: {gcppack.DEFAULT_COMPRESSION})")
+    parser.add_argument('--layout', type=int, choices=[1, 2], default=gcppack.FORMAT_VERSION,
+                        help="1 nested archives, 2 flat with a manifest")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    generate(args.output, args.decks, args.cards, args.image, args.sound, args.hints,
+             args.sound_format, args.compression, args.layout, args.seed)
+    print(f"Wrote {args.output}: {args.decks} decks, {args.decks * args.cards} cards, "
+          f"{os.path.getsize(args.output) / (1024 * 1024):.2f} MB in {time.perf_counter() - start:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import gcppack
+import gcptrace
+
+# How often (ms) the Tk thread drains finished jobs
+POLL_INTERVAL = 15
+# Rows handed to the Tk thread per event-loop tick
+BATCH_SIZE = 200
+
+
+class Loader:
+    # Runs pack work on a thread pool and hands results back to the Tk thread
+    # through a queue drained from root.after, since Tk itself must only be
+    # touched from the main thread. Every job belongs to a generation;
+    # cancel() starts a new one, so late results for a pack the user has
+    # already moved away from are dropped instead of applied.
+    def __init__(self, root, max_workers=None):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gcp-loader')
+        self.results = queue.Queue()
+        self.generation = 0
+        self.futures = set()
+        self.polling = False
+
+    def cancel(self):
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures.clear()
+
+    def submit(self, func, *args, callback=None, errback=None, executor=None):
+        # executor lets callers run on another pool (e.g. processes) while
+        # still getting generation checks and delivery on the Tk thread
+        generation = self.generation
+        future = (executor or self.executor).submit(func, *args)
+        self.futures.add(future)
+        future.add_done_callback(lambda f: self.results.put((generation, f, callback, errback)))
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_INTERVAL, self.poll)
+        return future
+
+    def call_soon(self, func, *args):
+        # Safe from worker threads: run func(*args) on the Tk thread
+        self.results.put((self.generation, None, func, args))
+
+    def poll(self):
+        while True:
+            try:
+                generation, future, callback, errback = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.futures.discard(future)
+            if generation != self.generation or (future and future.cancelled()):
+                continue
+            try:
+                if future is None:
+                    callback(*errback)
+                    continue
+                error = future.exception()
+                if error is not None:
+                    if errback:
+                        errback(error)
+                elif callback:
+                    callback(future.result())
+            except Exception as e:
+                self.root.report_callback_exception(type(e), e, e.__traceback__)
+
+        if self.futures:
+            self.root.after(POLL_INTERVAL, self.poll)
+        else:
+            self.polling = False
+
+    def run_batches(self, items, func, batch_size=BATCH_SIZE, progress=None, done=None):
+        # Feed items to func on the Tk thread a batch per tick so the window
+        # keeps handling events while a large pack is being populated
+        generation = self.generation
+
+        def step(start):
+            if generation != self.generation:
+                return
+            end = min(start + batch_size, len(items))
+            for item in items[start:end]:
+                func(item)
+            if progress:
+                progress(end, len(items))
+            if end < len(items):
+                self.root.after(1, step, end)
+            elif done:
+                done()
+
+        step(0)
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load_pack(file_path, blobs=None):
+    # Worker side of open_gcp: read the archive and index the inner archives
+    # off the Tk thread. The rows only need info.json; a deck is decoded
+    # when the editor opens it or a save has to rewrite it.
+    with gcptrace.span('open_gcp.load', bytes=os.path.getsize(file_path)) as trace:
+        reader = gcppack.PackReader(file_path)
+        assets = gcppack.AssetStore(reader, blobs)
+        decks = [list(card.values())[0] for card in reader.info.get('cards', [])]
+        for kind in gcppack.LAYOUT:
+            reader.archive(kind)
+        trace.add(items=len(decks))
+    return assets, decks
+
+
+def prepare_thumbnail(assets, thumbnails, deck_id):
+    data = assets.get('image', deck_id)
+    if data is None:
+        return None
+    with gcptrace.span('thumbnail.prepare', bytes=len(data), items=1):
+        return thumbnails.prepare(data)
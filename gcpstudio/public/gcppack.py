@@ -0,0 +1,618 @@
+import io
+import json
+import mmap
+import os
+import shutil
+import stat
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+
+import gcpcodec
+import gcptrace
+
+# Asset kind -> (inner archive, member extension, asset extension)
+LAYOUT = {
+    'deck': ('deck.gcdp', '.gcd', '.json'),
+    'image': ('image.gcip', '.gci', '.png'),
+    'sound': ('sound.gcsp', '.gcs', '.m4a'),
+}
+
+# Version 1 nests one archive per kind inside the .gcp (the layout the game
+# reads). Version 2 stores every member directly in the .gcp under
+# <kind>/<id><member_ext> and lists them in manifest.json, so any member is
+# one central directory lookup away.
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+# Inner archives being written stay in memory up to this size, then spill to disk
+SPOOL_SIZE = 32 * 1024 * 1024
+
+
+def _umask():
+    # os.umask can only be read by setting it, so do it once at import,
+    # before any worker thread creates files
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+UMASK = _umask()
+
+# compress_type for members deflated or stored, whichever comes out smaller
+ZIP_SMALLER = -1
+
+# Save presets: member kind -> (compress_type, compresslevel). Deck JSON
+# shrinks several times over, while png images and m4a sounds are already
+# compressed and only cost time on a second pass, so they stay stored
+# except in 'smallest', which deflates every member and keeps that where
+# it helps. The inner archives themselves are always stored in the outer
+# .gcp so readers can open them in place.
+COMPRESSION = {
+    'stored': {
+        'info': (zipfile.ZIP_STORED, None),
+        'deck': (zipfile.ZIP_STORED, None),
+        'image': (zipfile.ZIP_STORED, None),
+        'sound': (zipfile.ZIP_STORED, None),
+    },
+    'fast': {
+        'info': (zipfile.ZIP_DEFLATED, 1),
+        'deck': (zipfile.ZIP_DEFLATED, 1),
+        'image': (zipfile.ZIP_STORED, None),
+        'sound': (zipfile.ZIP_STORED, None),
+    },
+    'balanced': {
+        'info': (zipfile.ZIP_DEFLATED, 9),
+        'deck': (zipfile.ZIP_DEFLATED, 9),
+        'image': (zipfile.ZIP_STORED, None),
+        'sound': (zipfile.ZIP_STORED, None),
+    },
+    'smallest': {
+        'info': (zipfile.ZIP_DEFLATED, 9),
+        'deck': (ZIP_SMALLER, 9),
+        'image': (ZIP_SMALLER, 9),
+        'sound': (ZIP_SMALLER, 9),
+    },
+}
+DEFAULT_COMPRESSION = 'balanced'
+
+
+class MappedSlice(io.RawIOBase):
+    # Read-only file over (part of) a memory-mapped pack for zipfile, so a
+    # stored inner archive can be parsed in place
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += len(self.view)
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(self.pos + size, len(self.view))
+        data = bytes(self.view[self.pos:end])
+        self.pos = max(self.pos, end)
+        return data
+
+    def close(self):
+        self.view.release()
+        super().close()
+
+
+def data_offset(buffer, header_offset):
+    # Where a member's bytes start: after its local header, whose name and
+    # extra field lengths may differ from the central directory's
+    header = bytes(buffer[header_offset:header_offset + 30])
+    if header[:4] != b'PK\x03\x04':
+        raise zipfile.BadZipFile("Bad local file header")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    return header_offset + 30 + name_length + extra_length
+
+
+def can_write_raw(zipf):
+    # write_raw relies on ZipFile internals; without them members are
+    # recompressed instead
+    return all(hasattr(zipf, name) for name in ('_lock', '_writing', '_writecheck', '_didModify', 'start_dir', 'fp'))
+
+
+def write_raw(zipf, zinfo, data):
+    # Add a member whose bytes are already compressed (per zinfo). zipfile
+    # has no public call for this, so it mirrors what ZipFile.open(..., 'w')
+    # does around the compressor.
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    with zipf._lock:
+        if zipf._writing:
+            raise ValueError("Can't write to the ZIP file while there is another write handle open on it")
+        zipf.fp.seek(zipf.start_dir)
+        zinfo.header_offset = zipf.fp.tell()
+        zipf._writecheck(zinfo)
+        zipf._didModify = True
+        zipf.fp.write(zinfo.FileHeader(zip64))
+        for start in range(0, len(data), gcpcodec.CHUNK_SIZE):
+            zipf.fp.write(data[start:start + gcpcodec.CHUNK_SIZE])
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
+        zipf.start_dir = zipf.fp.tell()
+
+
+def raw_info(name, info):
+    # ZipInfo for copying info's member, already compressed, under name
+    zinfo = zipfile.ZipInfo(name, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.external_attr = info.external_attr
+    # Sizes go in the local header, so no data descriptor follows
+    zinfo.flag_bits = info.flag_bits & ~0x08
+    return zinfo
+
+
+class PackReader:
+    # Reads a .gcp through a read-only memory map, so opening a pack copies
+    # nothing: pages are only touched when a member is read. The nested
+    # deck/image/sound archives are only opened the first time one of their
+    # members is asked for, and stored archives are parsed in place. view()
+    # hands out stored members as memoryview slices of the map without a
+    # copy. Version 2 packs are read straight from the outer archive.
+    def __init__(self, file_path):
+        self.path = file_path
+        with open(file_path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file = MappedSlice(memoryview(self.mmap))
+        self.zipf = None
+        self.archives = {}
+        self.members = {}
+        # Offset of each stored inner archive within the map
+        self.bases = {}
+        self.slices = []
+        self.lock = threading.Lock()
+
+        # A pack that fails to open must not stay mapped (and, on Windows,
+        # locked against being deleted or replaced)
+        try:
+            self.zipf = zipfile.ZipFile(self.file)
+            try:
+                self.info = json.loads(self.zipf.read('info.json'))
+            except KeyError:
+                raise FileNotFoundError("info.json not found in the GCP file")
+
+            self.version = 1
+            if MANIFEST in self.zipf.NameToInfo:
+                manifest = json.loads(self.zipf.read(MANIFEST))
+                self.version = manifest['version']
+                for kind in LAYOUT:
+                    self.archives[kind] = self.zipf
+                    self.members[kind] = manifest['members'].get(kind, {})
+                    self.bases[kind] = 0
+        except BaseException:
+            self.close()
+            raise
+
+    def archive(self, kind):
+        with self.lock:
+            if kind not in self.members:
+                self.open_archive(kind)
+        return self.archives.get(kind)
+
+    def open_archive(self, kind):
+        with gcptrace.span('pack.open_archive', kind=kind) as trace:
+            self.index_archive(kind)
+            trace.add(items=len(self.members[kind]))
+
+    def index_archive(self, kind):
+        archive_name, member_ext, _ = LAYOUT[kind]
+        members = {}
+        try:
+            info = self.zipf.getinfo(archive_name)
+        except KeyError:
+            self.members[kind] = members
+            return
+        if info.compress_type == zipfile.ZIP_STORED:
+            start = data_offset(self.mmap, info.header_offset)
+            mapped = MappedSlice(memoryview(self.mmap)[start:start + info.file_size])
+            self.slices.append(mapped)
+            archive = zipfile.ZipFile(mapped)
+            self.bases[kind] = start
+        else:
+            archive = zipfile.ZipFile(io.BytesIO(self.zipf.read(info)))
+        for name in archive.namelist():
+            deck_id, ext = os.path.splitext(os.path.basename(name))
+            if ext == member_ext:
+                members[deck_id] = name
+        self.archives[kind] = archive
+        self.members[kind] = members
+
+    def has(self, kind, deck_id):
+        self.archive(kind)
+        return deck_id in self.members[kind]
+
+    def ids(self, kind):
+        self.archive(kind)
+        return list(self.members[kind])
+
+    def open(self, kind, deck_id):
+        # File object over the raw member (decks still encoded)
+        archive = self.archive(kind)
+        name = self.members[kind].get(deck_id)
+        if name is None:
+            return None
+        return archive.open(name)
+
+    def raw(self, kind, deck_id):
+        # (ZipInfo, offset in the map) of a member's bytes as they sit in the
+        # file, or None when the archive holding it is itself compressed
+        archive = self.archive(kind)
+        name = self.members[kind].get(deck_id)
+        base = self.bases.get(kind)
+        if name is None or base is None:
+            return None
+        info = archive.getinfo(name)
+        if info.flag_bits & 0x1:
+            # Encrypted
+            return None
+        return info, data_offset(self.mmap, base + info.header_offset)
+
+    def view(self, kind, deck_id):
+        # Raw member bytes, as a zero-copy slice of the map when the member
+        # (and the inner archive holding it) is stored
+        raw = self.raw(kind, deck_id)
+        if raw is None or raw[0].compress_type != zipfile.ZIP_STORED:
+            name = self.members[kind].get(deck_id)
+            return self.archive(kind).read(name) if name is not None else None
+        info, start = raw
+        return memoryview(self.mmap)[start:start + info.file_size]
+
+    def read(self, kind, deck_id):
+        archive = self.archive(kind)
+        name = self.members[kind].get(deck_id)
+        if name is None:
+            return None
+        data = archive.read(name)
+        if kind == 'deck':
+            data = gcpcodec.decode(data)
+        return data
+
+    def close(self):
+        # False when views handed out are still alive: the map then stays
+        # until they are gone, and the file can't be replaced on Windows
+        for archive in self.archives.values():
+            if archive is not self.zipf:
+                archive.close()
+        for mapped in self.slices:
+            mapped.close()
+        self.archives = {}
+        self.slices = []
+        if self.zipf is not None:
+            self.zipf.close()
+        self.file.close()
+        try:
+            self.mmap.close()
+        except BufferError:
+            return False
+        return True
+
+
+class AssetStore:
+    # Deck-id keyed view of an open pack plus any unsaved edits. Members are
+    # decoded from the pack on first access and kept for later lookups
+    # (images and sounds as views into the reader's map); a None edit marks
+    # an asset as removed. With a blob store (gcpblobs), edited images and
+    # sounds are kept there rather than in memory and saved from disk.
+    def __init__(self, reader=None, blobs=None):
+        self.reader = reader
+        self.blobs = blobs
+        self.edits = {}
+        self.blob_edits = {}
+        self.cache = {}
+
+    def has(self, kind, deck_id):
+        key = (kind, deck_id)
+        if key in self.blob_edits:
+            return True
+        if key in self.edits:
+            return self.edits[key] is not None
+        return self.reader is not None and self.reader.has(kind, deck_id)
+
+    def get(self, kind, deck_id):
+        key = (kind, deck_id)
+        if key in self.blob_edits:
+            return self.blobs.read(self.blob_edits[key])
+        if key in self.edits:
+            return self.edits[key]
+        if key not in self.cache:
+            if self.reader is None:
+                return None
+            if kind == 'deck':
+                self.cache[key] = self.reader.read(kind, deck_id)
+            else:
+                self.cache[key] = self.reader.view(kind, deck_id)
+        return self.cache[key]
+
+    def put(self, kind, deck_id, data):
+        if data is not None and kind != 'deck' and self.blobs is not None:
+            self.put_blob(kind, deck_id, self.blobs.put(data))
+        else:
+            self.blob_edits.pop((kind, deck_id), None)
+            self.edits[(kind, deck_id)] = data
+
+    def put_file(self, kind, deck_id, file_path):
+        if kind != 'deck' and self.blobs is not None:
+            self.put_blob(kind, deck_id, self.blobs.put_file(file_path))
+        else:
+            with open(file_path, 'rb') as f:
+                self.put(kind, deck_id, f.read())
+
+    def put_blob(self, kind, deck_id, digest):
+        self.edits.pop((kind, deck_id), None)
+        self.blob_edits[(kind, deck_id)] = digest
+
+    def file(self, kind, deck_id):
+        # Path of the blob an edited member is stored in, for streaming
+        digest = self.blob_edits.get((kind, deck_id))
+        return self.blobs.path(digest) if digest else None
+
+    def changed(self, kind, deck_id):
+        # Whether saving has to write this member from memory rather than
+        # copy it from the pack
+        return self.reader is None or (kind, deck_id) in self.edits or (kind, deck_id) in self.blob_edits
+
+    def rename(self, old_id, new_id):
+        for kind in LAYOUT:
+            if (kind, old_id) in self.blob_edits:
+                self.put_blob(kind, new_id, self.blob_edits.pop((kind, old_id)))
+                self.put(kind, old_id, None)
+            elif self.has(kind, old_id):
+                # A copy, so no edit keeps the pack's map alive
+                self.put(kind, new_id, bytes(self.get(kind, old_id)))
+                self.put(kind, old_id, None)
+
+    def attach(self, reader):
+        # Serve unedited members from another reader, e.g. the pack just
+        # saved. The old reader's cached views are dropped before it is
+        # closed so its map is released; False when it could not be.
+        self.cache = {}
+        unmapped = self.reader.close() if self.reader else True
+        self.reader = reader
+        return unmapped
+
+    def saved(self, reader):
+        # The edits are now part of the pack reader has open
+        self.attach(reader)
+        self.edits = {}
+        self.blob_edits = {}
+
+    def close(self):
+        self.cache = {}
+        if self.reader:
+            self.reader.close()
+        self.reader = None
+        self.edits = {}
+        self.blob_edits = {}
+
+
+def deflate_saves(chunks, level):
+    # Whether deflating the chunks comes out smaller than storing them
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    size = compressed = 0
+    for chunk in chunks:
+        size += len(chunk)
+        compressed += len(compressor.compress(chunk))
+    return compressed + len(compressor.flush()) < size
+
+
+def file_mode(path):
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~UMASK
+
+
+class PackWriter:
+    # Builds each inner archive in a spooled buffer (memory first, disk only
+    # past spool_size) and streams it straight into the outer .gcp, so every
+    # asset is read and written exactly once. compression names one of the
+    # COMPRESSION presets. Version 2 packs skip the spools and write members
+    # straight into the outer archive. The .gcp is built next to
+    # output_path and only replaces it once complete, so a pack can be
+    # saved over the file it was opened from.
+    def __init__(self, output_path, spool_size=SPOOL_SIZE, compression=DEFAULT_COMPRESSION, version=FORMAT_VERSION):
+        self.output_path = output_path
+        self.policy = COMPRESSION[compression]
+        self.version = version
+        self.manifest = {kind: {} for kind in LAYOUT}
+        fd, self.temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), suffix='.tmp')
+        os.close(fd)
+        self.zipf = zipfile.ZipFile(self.temp_path, 'w')
+        self.spools = {}
+        self.archives = {}
+        # Inner archives copied whole from another pack (copy_archive)
+        self.whole = {}
+        for kind in LAYOUT:
+            if version == 2:
+                self.archives[kind] = self.zipf
+                continue
+            spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+            self.spools[kind] = spool
+            self.archives[kind] = zipfile.ZipFile(spool, 'w')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def member_name(self, kind, deck_id):
+        if self.version == 2:
+            return f"{kind}/{deck_id}{LAYOUT[kind][1]}"
+        return deck_id + LAYOUT[kind][1]
+
+    def compress_type(self, kind, chunks):
+        # How to compress a member with these bytes
+        compress_type, level = self.policy[kind]
+        if compress_type != ZIP_SMALLER:
+            return compress_type
+        return zipfile.ZIP_DEFLATED if deflate_saves(chunks, level) else zipfile.ZIP_STORED
+
+    def accepts(self, kind, compress_type):
+        # Whether a member compressed this way can be copied as it is. Under
+        # ZIP_SMALLER only deflated members are: stored ones may still shrink.
+        policy = self.policy[kind][0]
+        return compress_type == policy or (policy == ZIP_SMALLER and compress_type == zipfile.ZIP_DEFLATED)
+
+    def open_member(self, kind, deck_id, size=0, compress_type=None):
+        name = self.member_name(kind, deck_id)
+        archive = self.archives[kind]
+        archive.compression, archive.compresslevel = self.policy[kind]
+        if compress_type is not None:
+            archive.compression = compress_type
+        self.manifest[kind][deck_id] = name
+        return archive.open(name, 'w', force_zip64=size > zipfile.ZIP64_LIMIT)
+
+    def add(self, kind, deck_id, data):
+        if kind == 'deck':
+            data = gcpcodec.encode(data)
+        with self.open_member(kind, deck_id, len(data), self.compress_type(kind, [data])) as dst:
+            dst.write(data)
+
+    def add_file(self, kind, deck_id, file_path):
+        compress_type = None
+        if self.policy[kind][0] == ZIP_SMALLER:
+            # A first pass over the file to see whether deflate helps
+            with open(file_path, 'rb') as src:
+                chunks = iter(lambda: src.read(gcpcodec.CHUNK_SIZE), b'')
+                compress_type = self.compress_type(kind, map(gcpcodec.encode, chunks) if kind == 'deck' else chunks)
+        with open(file_path, 'rb') as src, self.open_member(kind, deck_id, os.path.getsize(file_path), compress_type) as dst:
+            if kind == 'deck':
+                gcpcodec.encode_stream(src, dst)
+            else:
+                shutil.copyfileobj(src, dst, gcpcodec.CHUNK_SIZE)
+
+    def copy(self, kind, deck_id, src, size=0):
+        # Raw member bytes from another pack; decks are already encoded
+        if self.policy[kind][0] == ZIP_SMALLER:
+            data = src.read()
+            with self.open_member(kind, deck_id, len(data), self.compress_type(kind, [data])) as dst:
+                dst.write(data)
+            return
+        with self.open_member(kind, deck_id, size) as dst:
+            shutil.copyfileobj(src, dst, gcpcodec.CHUNK_SIZE)
+
+    def copy_from(self, reader, kind, deck_id):
+        # Copy an unchanged member from the pack reader has open. When it
+        # is already compressed the way this writer would compress it, its
+        # compressed bytes go across as they are: no inflate, no re-encode.
+        raw = reader.raw(kind, deck_id)
+        if raw is None or not self.accepts(kind, raw[0].compress_type) or not can_write_raw(self.archives[kind]):
+            with reader.open(kind, deck_id) as src:
+                self.copy(kind, deck_id, src, raw[0].file_size if raw else 0)
+            return
+
+        info, start = raw
+        name = self.member_name(kind, deck_id)
+        self.manifest[kind][deck_id] = name
+        self.write_raw(self.archives[kind], raw_info(name, info), reader, start)
+
+    def write_raw(self, zipf, zinfo, reader, start):
+        data = memoryview(reader.mmap)[start:start + zinfo.compress_size]
+        try:
+            write_raw(zipf, zinfo, data)
+        finally:
+            data.release()
+
+    def copy_archive(self, reader, kind):
+        # Take a v1 pack's whole inner archive over as one raw copy; only
+        # valid when none of its members changed. False when its members
+        # are compressed differently from this writer's policy, or raw
+        # copies aren't possible (can_write_raw).
+        archive = reader.archive(kind)
+        if self.version != 1 or reader.version != 1 or archive is None or not can_write_raw(self.zipf):
+            return False
+        if not all(self.accepts(kind, info.compress_type) for info in archive.infolist()):
+            return False
+        self.whole[kind] = reader
+        return True
+
+    def write(self, info):
+        if not isinstance(info, (bytes, str)):
+            info = json.dumps(info, indent=2)
+
+        compress_type, level = self.policy['info']
+        self.zipf.writestr('info.json', info, compress_type=compress_type, compresslevel=level)
+        if self.version == 2:
+            manifest = json.dumps({'version': 2, 'members': self.manifest}, indent=2)
+            self.zipf.writestr(MANIFEST, manifest, compress_type=compress_type, compresslevel=level)
+        for kind, (archive_name, _, _) in LAYOUT.items():
+            if kind in self.whole:
+                reader = self.whole[kind]
+                info = reader.zipf.getinfo(archive_name)
+                self.write_raw(self.zipf, raw_info(archive_name, info), reader, data_offset(reader.mmap, info.header_offset))
+                continue
+            if kind not in self.spools:
+                continue
+            self.archives[kind].close()
+            spool = self.spools[kind]
+            size = spool.seek(0, os.SEEK_END)
+            spool.seek(0)
+            with self.zipf.open(archive_name, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as dst:
+                shutil.copyfileobj(spool, dst, gcpcodec.CHUNK_SIZE)
+        self.zipf.close()
+        # mkstemp files are owner-only; give the pack the mode of the file it
+        # replaces, or that of any newly created file
+        os.chmod(self.temp_path, file_mode(self.output_path))
+        os.replace(self.temp_path, self.output_path)
+
+    def close(self):
+        for kind, spool in self.spools.items():
+            self.archives[kind].close()
+            spool.close()
+        self.zipf.close()
+        if os.path.exists(self.temp_path):
+            # write() was never reached
+            os.remove(self.temp_path)
+
+
+def pack_folder(folder_path, output_path, compression=DEFAULT_COMPRESSION, version=FORMAT_VERSION):
+    # Pack a staged info.json + deck/image/sound folder tree into a .gcp
+    with open(os.path.join(folder_path, "info.json"), 'rb') as f:
+        info = f.read()
+
+    with gcptrace.span('compress_pack') as trace, PackWriter(output_path, compression=compression, version=version) as writer:
+        for kind, (_, _, asset_ext) in LAYOUT.items():
+            kind_path = os.path.join(folder_path, kind)
+            if not os.path.isdir(kind_path):
+                continue
+            for file in sorted(os.listdir(kind_path)):
+                if file.endswith(asset_ext):
+                    writer.add_file(kind, file[:-len(asset_ext)], os.path.join(kind_path, file))
+                    trace.add(items=1)
+        writer.write(info)
+        trace.add(bytes=os.path.getsize(output_path))
+
+
+def convert(src_path, dst_path, version=2, compression=DEFAULT_COMPRESSION):
+    # Rewrite a pack in another layout version, copying members raw
+    reader = PackReader(src_path)
+    try:
+        with PackWriter(dst_path, compression=compression, version=version) as writer:
+            for kind in LAYOUT:
+                for deck_id in reader.ids(kind):
+                    writer.copy_from(reader, kind, deck_id)
+            writer.write(reader.zipf.read('info.json'))
+    finally:
+        reader.close()
@@ -0,0 +1,119 @@
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import gcppack
+
+# Hits returned for one query
+SEARCH_LIMIT = 200
+
+
+def fts_query(text):
+    # Every word must match, each as a prefix, with FTS5 syntax escaped
+    words = text.split()
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+class SearchIndex:
+    # Full-text index (SQLite FTS5) over the answers and hints of every card
+    # in every pack we have seen, persisted in the app data dir. Packs are
+    # only re-read when their size or mtime changed; an edited deck is
+    # reindexed on its own. Safe to share between the Tk thread (search)
+    # and an indexing worker.
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS packs (path TEXT PRIMARY KEY, pack_id TEXT, name TEXT, size INTEGER, mtime REAL)")
+            self.db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS cards USING fts5("
+                "answer, hints, path UNINDEXED, pack_id UNINDEXED, deck_id UNINDEXED, deck_name UNINDEXED, card UNINDEXED)")
+
+    def is_current(self, path):
+        row = self.db.execute("SELECT size, mtime FROM packs WHERE path = ?", (path,)).fetchone()
+        stat = os.stat(path)
+        return row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime
+
+    def index_pack(self, path):
+        # Returns True when the pack had to be (re)read
+        path = os.path.abspath(path)
+        with self.lock:
+            if self.is_current(path):
+                return False
+        stat = os.stat(path)
+        reader = gcppack.PackReader(path)
+        try:
+            info = reader.info
+            rows = []
+            for card in info.get('cards', []):
+                deck = next(iter(card.values()))
+                data = reader.read('deck', deck['id'])
+                if data is not None:
+                    rows.extend(self.card_rows(path, info.get('id', ''), deck['id'], deck.get('name', ''), json.loads(data).get('cards', [])))
+        finally:
+            reader.close()
+
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM cards WHERE path = ?", (path,))
+            self.db.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute(
+                "INSERT OR REPLACE INTO packs VALUES (?, ?, ?, ?, ?)",
+                (path, info.get('id', ''), info.get('name', ''), stat.st_size, stat.st_mtime))
+        return True
+
+    def card_rows(self, path, pack_id, deck_id, deck_name, cards):
+        return [
+            (card.get('answer', ''), '\n'.join(card.get('hints', [])), path, pack_id, deck_id, deck_name, i)
+            for i, card in enumerate(cards)]
+
+    def index_deck(self, path, pack_id, deck_id, deck_name, cards):
+        # An edited (possibly unsaved) deck; the pack is marked stale so the
+        # next scan rereads it from disk
+        path = os.path.abspath(path)
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM cards WHERE path = ? AND deck_id = ?", (path, deck_id))
+            self.db.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)", self.card_rows(path, pack_id, deck_id, deck_name, cards))
+            self.db.execute("UPDATE packs SET mtime = NULL WHERE path = ?", (path,))
+
+    def index_dir(self, folder):
+        count = 0
+        for path in sorted(glob.glob(os.path.join(str(folder), '*.gcp'))):
+            try:
+                count += self.index_pack(path)
+            except Exception:
+                # A broken or half-written pack just stays out of the index
+                continue
+        return count
+
+    def remove_pack(self, path):
+        path = os.path.abspath(path)
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM cards WHERE path = ?", (path,))
+            self.db.execute("DELETE FROM packs WHERE path = ?", (path,))
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        # [(path, pack_id, deck_id, deck_name, card, answer, hints)], best first
+        query = fts_query(text)
+        if not query:
+            return []
+        with self.lock:
+            return self.db.execute(
+                "SELECT path, pack_id, deck_id, deck_name, card, answer, hints FROM cards WHERE cards MATCH ? ORDER BY rank LIMIT ?",
+                (query, limit)).fetchall()
+
+    def close(self):
+        # Under the lock, so an indexing worker never sees it half-closed
+        with self.lock:
+            self.db.close()
+
+
+if __name__ == "__main__":
+    # python gcpsearch.py index.db PACK_DIR QUERY...
+    index = SearchIndex(sys.argv[1])
+    index.index_dir(sys.argv[2])
+    for path, pack_id, deck_id, deck_name, card, answer, hints in index.search(' '.join(sys.argv[3:])):
+        print(f"{pack_id} / {deck_name or deck_id} #{card + 1}: {answer}")
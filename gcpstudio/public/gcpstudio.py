@@ -2,16 +2,22 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser, simpledialog
 import customtkinter
 import os
+import io
+import base64
 import json
-import zipfile
-import shutil
-import tempfile
-from PIL import Image, ImageTk
+from PIL import Image
 import requests
-from pathlib import Path
-from pydub import AudioSegment
-from pydub.playback import play
 import pygame
+import gcppack
+import gcpcache
+import gcploader
+import gcpdownload
+import gcpaudio
+import gcpblobs
+import gcpcore
+import gcpsearch
+import gcpeditor
+import gcptrace
 
 class GCPStudio:
     def __init__(self, root):
@@ -22,10 +28,49 @@ class GCPStudio:
         pygame.init()
         pygame.mixer.init()
 
-        self.temp_dir = None
+        # Edited images and sounds, and downloaded packs, stored by content
+        self.blobs = gcpblobs.BlobStore(gcpcache.app_data_dir() / 'blobs')
+        self.assets = gcppack.AssetStore(blobs=self.blobs)
         self.current_gcp_path = None
         self.opened_packs = {}
+        self.thumbnails = gcpcache.ThumbnailCache(gcpcache.app_data_dir() / 'thumbnails', wrap=self.make_photo)
+        self.tree_images_job = None
+        self.tree_images_pending = set()
+        self.color_tags = set()
+        self.loader = gcploader.Loader(self.root)
+        self.downloads = gcploader.Loader(self.root, max_workers=gcpdownload.MAX_WORKERS)
+        self.downloader = gcpdownload.PackDownloader(gcpcache.app_data_dir(), blobs=self.blobs)
+        self.audio = gcpaudio.AudioCache(pygame.mixer.get_init())
+        self.audio_prefetcher = gcpaudio.AudioPrefetcher(self.loader, self.audio)
+        self.prefetch_sounds = tk.BooleanVar(value=True)
+        self.compression = tk.StringVar(value=gcppack.DEFAULT_COMPRESSION)
+        self.flat_layout = tk.BooleanVar(value=gcppack.FORMAT_VERSION == 2)
+        self.current_sound = None
+        self.search_index = gcpsearch.SearchIndex(gcpcache.app_data_dir() / 'search.db')
+        self.indexer = gcploader.Loader(self.root, max_workers=1)
+        self.search_job = None
+        self.search_hits = {}
+        self.pending_deck = None
+        self.open_trace = gcptrace.NULL_SPAN
+        self.rows_trace = gcptrace.NULL_SPAN
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Bring the index up to date with the downloaded packs
+        self.indexer.submit(self.search_index.index_dir, gcpcache.app_data_dir())
+        self.indexer.submit(self.blobs.prune)
+
+    def on_close(self):
+        # Drop queued work and stop what is running, or the interpreter waits
+        # for every worker thread to drain its queue before exiting
+        self.cancel_loading()
+        for loader in (self.loader, self.downloads, self.indexer):
+            loader.shutdown()
+        self.audio_prefetcher.shutdown()
+        self.downloader.close()
+        self.search_index.close()
+        self.close_pack()
+        self.root.destroy()
 
     def setup_ui(self):
         # Main frame
@@ -44,6 +89,20 @@ class GCPStudio:
         download_button = ttk.Button(pack_manager_frame, text="Download Packs", command=self.download_packs)
         download_button.pack(pady=10)
 
+        # Card search across every opened and downloaded pack
+        search_frame = ttk.LabelFrame(pack_manager_frame, text="Search Cards", padding="5")
+        search_frame.pack(fill=tk.BOTH, expand=True)
+        self.search_entry = ttk.Entry(search_frame)
+        self.search_entry.pack(fill=tk.X)
+        self.search_entry.bind('<KeyRelease>', self.schedule_search)
+        self.search_results = ttk.Treeview(search_frame, columns=('Deck', 'Answer'), show='headings', height=8)
+        self.search_results.heading('Deck', text='Deck')
+        self.search_results.heading('Answer', text='Answer')
+        self.search_results.column('Deck', width=90)
+        self.search_results.column('Answer', width=110)
+        self.search_results.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+        self.search_results.bind('<Double-1>', self.open_search_result)
+
         # Right side frame
         right_frame = ttk.Frame(main_frame)
         right_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -72,6 +131,9 @@ class GCPStudio:
         self.decks_tree.heading('Sound', text='Sound')
         self.decks_tree.heading('Edit', text='Edit')
         self.decks_tree.pack(fill=tk.BOTH, expand=True)
+        self.decks_tree.images = {}
+        self.decks_tree.configure(yscrollcommand=self.schedule_tree_images)
+        self.decks_tree.bind('<Configure>', self.schedule_tree_images)
 
         self.decks_tree.column('Image', width=50, anchor='center')
         self.decks_tree.column('Sound', width=50, anchor='center')
@@ -84,6 +146,20 @@ class GCPStudio:
         ttk.Button(buttons_frame, text="Open GCP", command=self.open_gcp).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="Save GCP", command=self.save_gcp).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="Add Deck", command=self.add_deck).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Stats", command=self.show_stats).pack(side=tk.LEFT, padx=5)
+
+        ttk.Checkbutton(buttons_frame, text="Prefetch Sounds", variable=self.prefetch_sounds).pack(side=tk.LEFT, padx=5)
+
+        # Compression preset used by Save GCP
+        ttk.Label(buttons_frame, text="Compression:").pack(side=tk.LEFT, padx=(5, 0))
+        ttk.OptionMenu(buttons_frame, self.compression, self.compression.get(), *gcppack.COMPRESSION).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(buttons_frame, text="Flat Layout (v2)", variable=self.flat_layout).pack(side=tk.LEFT, padx=5)
+
+        # Progress of the background pack loader
+        self.progress = ttk.Progressbar(buttons_frame, length=150)
+        self.progress.pack(side=tk.RIGHT, padx=5)
+        self.progress_label = ttk.Label(buttons_frame)
+        self.progress_label.pack(side=tk.RIGHT, padx=5)
 
         # Bind pack tree selection
         self.pack_tree.bind('<<TreeviewSelect>>', self.on_pack_select)
@@ -100,7 +176,10 @@ class GCPStudio:
     def remove_pack(self, pack_id):
         self.pack_tree.delete(pack_id)
         if pack_id in self.opened_packs:
-            del self.opened_packs[pack_id]
+            pack_path = self.opened_packs.pop(pack_id)
+            # Downloaded packs stay searchable; others leave the index
+            if os.path.dirname(os.path.abspath(pack_path)) != str(gcpcache.app_data_dir()):
+                self.indexer.submit(self.search_index.remove_pack, pack_path)
 
             
     def download_packs(self):
@@ -114,10 +193,8 @@ class GCPStudio:
             return
 
         try:
-            # Fetch packstore.json
-            response = requests.get(packstore_url)
-            response.raise_for_status()
-            packstore = response.json()
+            # Fetch packstore.json, revalidating any cached copy
+            packstore = self.downloader.fetch_packstore(packstore_url)
 
             # Create a new window for pack selection
             select_window = tk.Toplevel(self.root)
@@ -165,28 +242,89 @@ class GCPStudio:
             messagebox.showerror("Error", f"Failed to fetch packstore: {str(e)}")
 
     def download_selected_packs(self, packstore, selected_packs):
-        base_url = os.path.dirname(packstore['url'])
-        app_data_dir = Path(os.getenv('APPDATA')) / 'GCP Studio'
-        app_data_dir.mkdir(parents=True, exist_ok=True)
+        packs = [pack for pack in packstore['packs'] if pack['id'] in selected_packs]
+        if not packs:
+            return
 
-        for pack in packstore['packs']:
-            if pack['id'] in selected_packs:
-                pack_url = f"{base_url}/packs/{pack['id']}.gcp"
-                try:
-                    response = requests.get(pack_url)
-                    response.raise_for_status()
-                    pack_path = app_data_dir / f"{pack['id']}.gcp"
-                    with open(pack_path, 'wb') as f:
-                        f.write(response.content)
-                    self.add_pack_to_tree(pack['id'], pack['name'], str(pack_path))
-                except requests.RequestException as e:
-                    messagebox.showerror("Error", f"Failed to download {pack['name']}: {str(e)}")
+        # The open pack stays mapped, and Windows can't replace a mapped
+        # file: close it while its update downloads and reopen it after
+        reopen = None
+        targets = {os.path.abspath(self.downloader.pack_path(pack['id'])) for pack in packs}
+        if self.current_gcp_path and os.path.abspath(self.current_gcp_path) in targets:
+            if (self.assets.edits or self.assets.blob_edits) and not messagebox.askyesno(
+                    "Unsaved Changes", "The open pack will be replaced by the download. Discard its unsaved changes?"):
+                return
+            reopen = self.current_gcp_path
+            self.cancel_loading()
+            self.close_pack()
+            self.decks_tree.delete(*self.decks_tree.get_children())
+
+        # One progress row per pack
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("Downloading Packs")
+        bars = {}
+        for row, pack in enumerate(packs):
+            ttk.Label(progress_window, text=pack['name']).grid(row=row, column=0, sticky=tk.W, padx=5, pady=2)
+            bars[pack['id']] = ttk.Progressbar(progress_window, length=200)
+            bars[pack['id']].grid(row=row, column=1, padx=5, pady=2)
+
+        remaining = set(bars)
 
-        messagebox.showinfo("Success", "Selected packs have been downloaded and added to the pack manager.")
+        def on_progress(pack_id, done, total):
+            bars[pack_id].configure(maximum=max(total, done, 1), value=done)
+
+        def on_finished(pack, pack_path=None, error=None):
+            if error is not None:
+                messagebox.showerror("Error", f"Failed to download {pack['name']}: {str(error)}")
+            else:
+                self.add_pack_to_tree(pack['id'], pack['name'], str(pack_path))
+
+            remaining.discard(pack['id'])
+            if not remaining:
+                progress_window.destroy()
+                if reopen and os.path.exists(reopen):
+                    self.open_gcp(reopen)
+                messagebox.showinfo("Success", "Selected packs have been downloaded and added to the pack manager.")
+
+        # Fetch the packs in parallel over one pooled session
+        for pack in packs:
+            self.downloads.submit(
+                self.downloader.download_pack, packstore, pack,
+                lambda done, total, pack_id=pack['id']: self.downloads.call_soon(on_progress, pack_id, done, total),
+                callback=lambda pack_path, pack=pack: on_finished(pack, pack_path),
+                errback=lambda error, pack=pack: on_finished(pack, error=error))
 
     def add_pack_to_tree(self, pack_id, pack_name, pack_path):
-        self.pack_tree.insert('', 'end', pack_id, text=pack_id, values=(pack_name,))
+        if not self.pack_tree.exists(pack_id):
+            self.pack_tree.insert('', 'end', pack_id, text=pack_id, values=(pack_name,))
         self.opened_packs[pack_id] = pack_path
+        self.indexer.submit(self.search_index.index_pack, pack_path)
+
+    def schedule_search(self, event=None):
+        # Search once typing pauses rather than on every key
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(150, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        self.search_results.delete(*self.search_results.get_children())
+        self.search_hits = {}
+        for path, pack_id, deck_id, deck_name, card, answer, hints in self.search_index.search(self.search_entry.get()):
+            item = self.search_results.insert('', 'end', values=(f"{pack_id}/{deck_name or deck_id}", answer))
+            self.search_hits[item] = (path, deck_id)
+
+    def open_search_result(self, event):
+        selection = self.search_results.selection()
+        if not selection:
+            return
+        path, deck_id = self.search_hits[selection[0]]
+        if self.current_gcp_path and os.path.abspath(self.current_gcp_path) == path:
+            self.open_deck_editor(deck_id)
+        else:
+            # Opens once the pack has loaded (on_decks_loaded)
+            self.pending_deck = deck_id
+            self.open_gcp(path)
 
     def on_pack_select(self, event):
         selected_item = self.pack_tree.selection()[0]
@@ -195,17 +333,21 @@ class GCPStudio:
             self.open_gcp(pack_path)
 
 
-    def cleanup_temp_dir(self):
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
-        self.temp_dir = None
+    def close_pack(self):
+        self.assets.close()
+        self.assets = gcppack.AssetStore(blobs=self.blobs)
         self.current_gcp_path = None
 
-    def set_tag_colors(self):
-        for item in self.decks_tree.get_children():
-            deck_id = self.decks_tree.item(item, 'values')[1]
-            color = self.decks_tree.item(item, 'values')[3]
-            self.decks_tree.tag_configure(deck_id, background=color)
+    def color_tag(self, color):
+        # One tag per distinct deck color, configured the first time it is used
+        tag = 'color:' + color
+        if tag not in self.color_tags:
+            self.color_tags.add(tag)
+            try:
+                self.decks_tree.tag_configure(tag, background=color.split('-')[0].strip())
+            except tk.TclError:
+                pass  # Not a color Tk knows; the row keeps the default background
+        return tag
             
     def open_gcp(self, file_path=None):
         if file_path is None:
@@ -213,35 +355,36 @@ class GCPStudio:
         if not file_path:
             return
 
+        # Drop whatever the previous pack was still loading
+        self.cancel_loading()
+        self.close_pack()
         self.current_gcp_path = file_path
-        self.temp_dir = tempfile.mkdtemp()
-
-        try:
-            # Decompress the GCP file
-            with zipfile.ZipFile(file_path, 'r') as zipf:
-                zipf.extractall(self.temp_dir)
 
-            # Ensure required directories exist
-            for dir_name in ['deck', 'image', 'sound']:
-                os.makedirs(os.path.join(self.temp_dir, dir_name), exist_ok=True)
-
-            # Decompress deck.gcdp if it exists
-            self.decompress_file(os.path.join(self.temp_dir, "deck.gcdp"), "deck", ".json")
-
-            # Decompress image.gcip if it exists
-            self.decompress_file(os.path.join(self.temp_dir, "image.gcip"), "image", ".png")
-
-            # Decompress sound.gcsp if it exists
-            self.decompress_file(os.path.join(self.temp_dir, "sound.gcsp"), "sound", ".m4a")
-
-            # Load info.json
-            info_path = os.path.join(self.temp_dir, "info.json")
-            if not os.path.exists(info_path):
-                raise FileNotFoundError("info.json not found in the GCP file")
-
-            with open(info_path, 'r') as f:
-                info = json.load(f)
+        # Initialize the images dictionary
+        self.decks_tree.images = {}
+        self.tree_images_pending = set()
+        self.decks_tree.delete(*self.decks_tree.get_children())
+
+        # Read and index the pack off the Tk thread
+        self.show_progress("Reading pack...")
+        # Covers reading, row insertion and the first thumbnails request
+        self.open_trace = gcptrace.begin('open_gcp', path=file_path)
+        self.loader.submit(gcploader.load_pack, file_path, self.blobs, callback=self.on_pack_loaded, errback=self.on_pack_load_error)
+
+    def cancel_loading(self):
+        # Stop loading the open pack; its open spans end marked cancelled,
+        # since their callbacks will never run
+        self.loader.cancel()
+        for trace in (self.rows_trace, self.open_trace):
+            trace.add(cancelled=1)
+            trace.end()
+        self.open_trace = self.rows_trace = gcptrace.NULL_SPAN
+
+    def on_pack_loaded(self, result):
+        self.assets, decks = result
+        info = self.assets.reader.info
 
+        try:
             # Update UI with pack info
             self.pack_id_entry.delete(0, tk.END)
             self.pack_id_entry.insert(0, info.get('id', ''))
@@ -252,64 +395,80 @@ class GCPStudio:
             pack_id = info.get('id', '')
             pack_name = info.get('name', '')
             if pack_id not in self.opened_packs:
-                self.add_pack_to_tree(pack_id, pack_name, file_path)
-
-            # Initialize the images dictionary
-            self.decks_tree.images = {}
-
-            # Clear and update decks tree
-            self.decks_tree.delete(*self.decks_tree.get_children())
-            for card in info.get('cards', []):
-                deck = list(card.values())[0]
-                image_path = os.path.join(self.temp_dir, "image", f"{deck['id']}.png")
-                sound_path = os.path.join(self.temp_dir, "sound", f"{deck['id']}.m4a")
-                
-                item = self.decks_tree.insert('', 'end', values=('', deck['id'], deck['name'], deck['color'], '', 'Edit'), tags=(deck['id'],))
-                self.update_tree_item_image(item, image_path)
-                self.decks_tree.set(item, 'Sound', '▶' if os.path.exists(sound_path) else '')
+                self.add_pack_to_tree(pack_id, pack_name, self.current_gcp_path)
 
-            self.decks_tree.bind('<Double-1>', self.edit_deck)
-            self.decks_tree.bind('<Button-3>', self.show_context_menu)
+            # Fill the decks tree a batch per tick
+            self.rows_trace = gcptrace.begin('open_gcp.rows', items=len(decks))
+            self.loader.run_batches(decks, self.insert_deck_row, progress=self.show_decks_progress, done=self.on_decks_loaded)
 
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to open GCP file: {str(e)}")
-            self.cleanup_temp_dir()
-
-
-    def decompress_file(self, file_path, target_dir, file_extension):
-        if os.path.exists(file_path):
-            target_dir_path = os.path.join(self.temp_dir, target_dir)
-            with zipfile.ZipFile(file_path, 'r') as zipf:
-                zipf.extractall(target_dir_path)
-            
-            # Rename and shift bits for decompressed files
-            for file in os.listdir(target_dir_path):
-                old_path = os.path.join(target_dir_path, file)
-                file_name, file_ext = os.path.splitext(file)
-                new_path = os.path.join(target_dir_path, file_name + file_extension)
-
-                if file_ext in ['.gcd', '.gci', '.gcs']:
-                    if file_ext == '.gcd':
-                        self.shift_bits(old_path, shift_up=False)
-                    os.rename(old_path, new_path)
-
-
-    def play_sound(self, sound_path):
-        if os.path.exists(sound_path):
+            self.on_pack_load_error(e)
+
+    def on_pack_load_error(self, error):
+        self.show_progress("")
+        self.pending_deck = None
+        self.open_trace.add(failed=1)
+        self.open_trace.end()
+        self.open_trace = gcptrace.NULL_SPAN
+        messagebox.showerror("Error", f"Failed to open GCP file: {str(error)}")
+        self.close_pack()
+
+    def insert_deck_row(self, deck):
+        sound = '▶' if self.assets.has('sound', deck['id']) else ''
+        self.decks_tree.insert('', 'end', values=('', deck['id'], deck['name'], deck['color'], sound, 'Edit'), tags=(self.color_tag(deck['color']),))
+
+    def on_decks_loaded(self):
+        self.show_progress("")
+        self.rows_trace.end()
+        self.rows_trace = gcptrace.NULL_SPAN
+
+        # Show the rows first, then decode thumbnails once the UI is idle
+        self.schedule_tree_images()
+
+        # Decode sounds ahead of the first click, visible rows first
+        if self.prefetch_sounds.get():
+            visible = self.visible_tree_items()
+            shown = set(visible)
+            items = visible + [item for item in self.decks_tree.get_children() if item not in shown]
+            self.audio_prefetcher.start(self.assets, [self.decks_tree.item(item, 'values')[1] for item in items])
+
+        self.decks_tree.bind('<Double-1>', self.edit_deck)
+        self.decks_tree.bind('<Button-3>', self.show_context_menu)
+
+        self.open_trace.add(items=len(self.decks_tree.get_children()))
+        self.open_trace.end()
+        self.open_trace = gcptrace.NULL_SPAN
+
+        if self.pending_deck:
+            deck_id, self.pending_deck = self.pending_deck, None
+            self.open_deck_editor(deck_id)
+
+    def show_progress(self, text, done=0, total=0):
+        self.progress_label.configure(text=text)
+        self.progress.configure(maximum=max(total, 1), value=done)
+
+    def show_decks_progress(self, done, total):
+        self.show_progress(f"Loading decks {done}/{total}", done, total)
+
+
+    def play_sound(self, deck_id):
+        data = self.assets.get('sound', deck_id)
+        if data is not None:
             try:
-                # Convert audio to WAV format
-                sound = AudioSegment.from_file(sound_path)
-                wav_path = tempfile.mktemp(suffix='.wav')
-                sound.export(wav_path, format='wav')
+                # Decode to PCM once; replays come straight from the cache
+                with gcptrace.span('play_sound', bytes=len(data), items=1):
+                    pcm = self.audio.get(deck_id, data)
 
-                # Play the WAV file using pygame
-                pygame.mixer.music.load(wav_path)
-                pygame.mixer.music.play()
+                # Play the samples from memory using pygame
+                if self.current_sound:
+                    self.current_sound.stop()
+                self.current_sound = pygame.mixer.Sound(buffer=pcm)
+                self.current_sound.play()
 
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to play sound: {str(e)}")
         else:
-            messagebox.showerror("Error", f"Sound file not found: {sound_path}")
+            messagebox.showerror("Error", f"Sound file not found: {deck_id}.m4a")
 
 
 
@@ -321,7 +480,7 @@ class GCPStudio:
             menu.add_command(label="Edit", command=lambda: self.edit_deck(None))
             
             sound_menu = tk.Menu(menu, tearoff=0)
-            sound_menu.add_command(label="Play Sound", command=lambda: self.play_sound(os.path.join(self.temp_dir, "sound", f"{self.decks_tree.item(item, 'values')[1]}.m4a")))
+            sound_menu.add_command(label="Play Sound", command=lambda: self.play_sound(self.decks_tree.item(item, 'values')[1]))
             sound_menu.add_command(label="Replace Sound", command=lambda: self.replace_sound(item))
             menu.add_cascade(label="Sound", menu=sound_menu)
             
@@ -338,9 +497,9 @@ class GCPStudio:
 
     def view_image(self, item):
         deck_id = self.decks_tree.item(item, 'values')[1]
-        image_path = os.path.join(self.temp_dir, "image", f"{deck_id}.png")
-        if os.path.exists(image_path):
-            img = Image.open(image_path)
+        data = self.assets.get('image', deck_id)
+        if data is not None:
+            img = Image.open(io.BytesIO(data))
             img.show()
         else:
             messagebox.showerror("Error", "Image file not found.")
@@ -349,16 +508,14 @@ class GCPStudio:
         deck_id = self.decks_tree.item(item, 'values')[1]
         new_image_path = filedialog.askopenfilename(filetypes=[("PNG files", "*.png")])
         if new_image_path:
-            dest_path = os.path.join(self.temp_dir, "image", f"{deck_id}.png")
-            shutil.copy(new_image_path, dest_path)
-            self.update_tree_item_image(item, dest_path)
+            self.assets.put_file('image', deck_id, new_image_path)
+            self.update_tree_item_image(item, deck_id)
 
     def replace_sound(self, item):
         deck_id = self.decks_tree.item(item, 'values')[1]
         new_sound_path = filedialog.askopenfilename(filetypes=[("M4A files", "*.m4a")])
         if new_sound_path:
-            dest_path = os.path.join(self.temp_dir, "sound", f"{deck_id}.m4a")
-            shutil.copy(new_sound_path, dest_path)
+            self.assets.put_file('sound', deck_id, new_sound_path)
             self.decks_tree.set(item, 'Sound', '▶')
 
     def rename_id(self, item):
@@ -380,30 +537,61 @@ class GCPStudio:
         new_color = colorchooser.askcolor(color=old_color, title="Choose color")[1]
         if new_color:
             self.decks_tree.set(item, 'Color', new_color)
+            self.decks_tree.item(item, tags=(self.color_tag(new_color),))
 
     def rename_associated_files(self, old_id, new_id):
-        for dir_name in ['image', 'sound', 'deck']:
-            old_path = os.path.join(self.temp_dir, dir_name, f"{old_id}{self.get_file_extension(dir_name)}")
-            new_path = os.path.join(self.temp_dir, dir_name, f"{new_id}{self.get_file_extension(dir_name)}")
-            if os.path.exists(old_path):
-                os.rename(old_path, new_path)
-
-    def get_file_extension(self, dir_name):
-        return {
-            'image': '.png',
-            'sound': '.m4a',
-            'deck': '.json'
-        }.get(dir_name, '')
-
-    def update_tree_item_image(self, item, image_path):
-        if os.path.exists(image_path):
-            image = Image.open(image_path).resize((30, 30))
-            photo = ImageTk.PhotoImage(image)
+        self.assets.rename(old_id, new_id)
+
+    def schedule_tree_images(self, *args):
+        # Called whenever the decks view scrolls or resizes
+        if self.tree_images_job is None:
+            self.tree_images_job = self.root.after_idle(self.load_tree_images)
+
+    def load_tree_images(self):
+        # Only decode thumbnails for rows that are actually on screen, and do
+        # the decoding on the loader's worker threads
+        self.tree_images_job = None
+        for item in self.visible_tree_items():
+            if item in self.decks_tree.images or item in self.tree_images_pending:
+                continue
+            self.tree_images_pending.add(item)
+            deck_id = self.decks_tree.item(item, 'values')[1]
+            self.loader.submit(
+                gcploader.prepare_thumbnail, self.assets, self.thumbnails, deck_id,
+                callback=lambda result, item=item: self.on_thumbnail_ready(item, result),
+                errback=lambda error, item=item: self.on_thumbnail_ready(item, None))
+
+    def visible_tree_items(self):
+        # Rows on screen, located from the scroll position so only those
+        # rows are asked for their bbox, not every row of the pack
+        items = self.decks_tree.get_children()
+        first, last = self.decks_tree.yview()
+        start = max(int(first * len(items)) - 1, 0)
+        end = min(int(last * len(items)) + 2, len(items))
+        return [item for item in items[start:end] if self.decks_tree.bbox(item)]
+
+    def on_thumbnail_ready(self, item, result):
+        self.tree_images_pending.discard(item)
+        if self.decks_tree.exists(item):
+            self.set_tree_item_image(item, self.thumbnails.finish(*result) if result else None)
+
+    def make_photo(self, png):
+        # Tk decodes the cached PNG thumbnails natively, without PIL
+        return tk.PhotoImage(data=base64.b64encode(png), format='png')
+
+    def update_tree_item_image(self, item, deck_id):
+        data = self.assets.get('image', deck_id)
+        with gcptrace.span('thumbnail.update', items=1):
+            self.set_tree_item_image(item, self.thumbnails.get(data) if data is not None else None)
+
+    def set_tree_item_image(self, item, photo):
+        if photo is not None:
             self.decks_tree.set(item, 'Image', '')
             self.decks_tree.item(item, image=photo)
             self.decks_tree.images[item] = photo  # Store the image reference
         else:
             self.decks_tree.set(item, 'Image', 'No image')
+            self.decks_tree.images[item] = None
 
 
     def save_gcp(self):
@@ -420,61 +608,72 @@ class GCPStudio:
             self.show_field_error(self.pack_name_entry, "Pack Name is required")
             return
 
-        # Create info.json
-        info = {
-            "id": self.pack_id_entry.get(),
-            "name": self.pack_name_entry.get(),
-            "cards": []
-        }
+        pack = self.build_pack()
+        if pack is None:
+            return
+
+        # Write edited decks, images and sounds; everything else is copied
+        # straight from the open pack, which therefore has to stay readable
+        # until the new archive is complete
+        same_file = bool(self.current_gcp_path) and os.path.exists(save_path) and os.path.samefile(save_path, self.current_gcp_path)
+        target_path = save_path + '.saving' if same_file else save_path
+        if same_file and os.path.exists(target_path):
+            # Left behind by a save that crashed
+            os.remove(target_path)
+        with gcptrace.span('save_gcp', items=len(pack.decks)):
+            gcpcore.save(pack, target_path, self.compression.get(), self.layout_version(), source=self.assets.reader)
+            if same_file:
+                # The writer gave the .saving file a new file's mode; keep
+                # the one of the pack it replaces
+                os.chmod(target_path, gcppack.file_mode(save_path))
+                # Unmap the old pack first (Windows can't replace a mapped file)
+                unmapped = self.assets.attach(None)
+                try:
+                    os.replace(target_path, save_path)
+                except OSError as e:
+                    # The old pack is still in place: serve it again, edits
+                    # and all, and drop the new copy
+                    self.assets.attach(gcppack.PackReader(save_path))
+                    os.remove(target_path)
+                    in_use = "" if unmapped else " (the open pack is still in use)"
+                    messagebox.showerror("Error", f"Could not replace {save_path}{in_use}: {e}")
+                    return
+                self.assets.saved(gcppack.PackReader(save_path))
+
+        self.indexer.submit(self.search_index.index_pack, save_path)
+        messagebox.showinfo("Success", f"Pack saved as {save_path}")
+
+    def build_pack(self):
+        # Snapshot the widgets and edited assets as a headless gcpcore.Pack
+        pack = gcpcore.Pack(id=self.pack_id_entry.get(), name=self.pack_name_entry.get())
 
         for item in self.decks_tree.get_children():
             values = self.decks_tree.item(item)['values']
             if not values[1] or not values[2] or not values[3]:
                 messagebox.showerror("Error", f"Deck {values[1]} is missing required fields (ID, Name, or Color)")
-                return
-            info['cards'].append({values[3]: {"id": values[1], "name": values[2], "color": values[3]}})
-
-        # Create temporary directory for packing
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Save info.json
-            with open(os.path.join(temp_dir, "info.json"), 'w') as f:
-                json.dump(info, f, indent=2)
-
-            # Create deck, image, and sound directories
-            os.makedirs(os.path.join(temp_dir, "deck"))
-            os.makedirs(os.path.join(temp_dir, "image"))
-            os.makedirs(os.path.join(temp_dir, "sound"))
-
-            # Copy or create placeholder files
-            for card in info['cards']:
-                deck_id = list(card.values())[0]['id']
-                
-                # Deck JSON
-                deck_path = os.path.join(temp_dir, "deck", f"{deck_id}.json")
-                if self.temp_dir and os.path.exists(os.path.join(self.temp_dir, "deck", f"{deck_id}.json")):
-                    shutil.copy(os.path.join(self.temp_dir, "deck", f"{deck_id}.json"), deck_path)
-                else:
-                    with open(deck_path, 'w') as f:
-                        json.dump({"name": list(card.values())[0]['name'], "color": list(card.values())[0]['color'], "cards": []}, f, indent=2)
-
-                # Image
-                image_path = os.path.join(temp_dir, "image", f"{deck_id}.png")
-                if self.temp_dir and os.path.exists(os.path.join(self.temp_dir, "image", f"{deck_id}.png")):
-                    shutil.copy(os.path.join(self.temp_dir, "image", f"{deck_id}.png"), image_path)
-                else:
-                    Image.new('RGB', (1, 1), color='white').save(image_path)
-
-                # Sound
-                sound_path = os.path.join(temp_dir, "sound", f"{deck_id}.m4a")
-                if self.temp_dir and os.path.exists(os.path.join(self.temp_dir, "sound", f"{deck_id}.m4a")):
-                    shutil.copy(os.path.join(self.temp_dir, "sound", f"{deck_id}.m4a"), sound_path)
+                return None
+            # Treeview hands numeric-looking values back as ints
+            deck_id = str(values[1])
+            deck = gcpcore.Deck(id=deck_id, name=str(values[2]), color=str(values[3]))
+
+            # Only edited members are loaded; the rest are copied on save,
+            # and edits kept in the blob store are streamed from there
+            deck.unchanged = tuple(kind for kind in gcppack.LAYOUT if not self.assets.changed(kind, deck_id))
+            for kind in ('image', 'sound'):
+                if kind in deck.unchanged:
+                    continue
+                path = self.assets.file(kind, deck_id)
+                if path:
+                    deck.files[kind] = path
                 else:
-                    open(sound_path, 'wb').close()  # Create empty file
+                    setattr(deck, kind, self.assets.get(kind, deck_id))
+            if 'deck' not in deck.unchanged:
+                data = self.assets.get('deck', deck_id)
+                if data is not None:
+                    deck.load_json(json.loads(data))
+            pack.decks.append(deck)
 
-            # Compress the pack
-            self.compress_pack(temp_dir, save_path)
-
-        messagebox.showinfo("Success", f"Pack saved as {save_path}")
+        return pack
 
     def show_field_error(self, widget, message):
         error_label = ttk.Label(widget.master, text=message, foreground="red")
@@ -516,23 +715,20 @@ class GCPStudio:
             if deck_id and deck_name and deck_color and image_path.get() and sound_path.get():
                 # Save image
                 img = Image.open(image_path.get())
-                img.save(os.path.join(self.temp_dir, "image", f"{deck_id}.png"))
+                buffer = io.BytesIO()
+                img.save(buffer, format='PNG')
+                self.assets.put('image', deck_id, buffer.getvalue())
 
                 # Save sound
-                shutil.copy(sound_path.get(), os.path.join(self.temp_dir, "sound", f"{deck_id}.m4a"))
+                self.assets.put_file('sound', deck_id, sound_path.get())
 
                 # Add to treeview
-                image = img.resize((30, 30))
-                photo = ImageTk.PhotoImage(image)
-                item = self.decks_tree.insert('', 'end', values=('', deck_id, deck_name, deck_color, '', 'Edit'))
-                self.decks_tree.set(item, 'Image', '')
-                self.decks_tree.item(item, image=photo)
-                self.decks_tree.set(item, 'Sound', '▶')
+                item = self.decks_tree.insert('', 'end', values=('', deck_id, deck_name, deck_color, '▶', 'Edit'), tags=(self.color_tag(deck_color),))
+                self.update_tree_item_image(item, deck_id)
 
                 # Create empty deck JSON file
-                deck_path = os.path.join(self.temp_dir, "deck", f"{deck_id}.json")
-                with open(deck_path, 'w') as f:
-                    json.dump({"name": deck_name, "color": deck_color, "cards": []}, f, indent=2)
+                deck_json = json.dumps({"name": deck_name, "color": deck_color, "cards": []}, indent=2)
+                self.assets.put('deck', deck_id, deck_json.encode())
 
                 dialog.destroy()
             else:
@@ -552,9 +748,12 @@ class GCPStudio:
         deck_window.geometry('800x600')
 
         # Load deck data
-        deck_path = os.path.join(self.temp_dir, "deck", f"{deck_id}.json")
-        with open(deck_path, 'r') as f:
-            deck_data = json.load(f)
+        data = self.assets.get('deck', deck_id)
+        if data is None:
+            deck_window.destroy()
+            messagebox.showerror("Error", "Deck file not found.")
+            return
+        deck_data = json.loads(data)
 
         # Deck info frame
         info_frame = ttk.Frame(deck_window)
@@ -577,72 +776,28 @@ class GCPStudio:
         cards_frame = ttk.Frame(deck_window)
         cards_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        # Create a canvas and scrollbar
-        canvas = tk.Canvas(cards_frame)
-        scrollbar = ttk.Scrollbar(cards_frame, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(
-                scrollregion=canvas.bbox("all")
-            )
-        )
-
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-
-        # Function to add a new card
-        def add_card(answer="", hints=["", "", ""]):
-            card_frame = ttk.Frame(scrollable_frame)
-            card_frame.pack(fill=tk.X, padx=5, pady=5)
-
-            ttk.Label(card_frame, text="Answer:").pack(side=tk.LEFT)
-            answer_entry = ttk.Entry(card_frame)
-            answer_entry.pack(side=tk.LEFT, expand=True, fill=tk.X)
-            answer_entry.insert(0, answer)
-
-            hints_frame = ttk.Frame(scrollable_frame)
-            hints_frame.pack(fill=tk.X, padx=5, pady=5)
-
-            hint_entries = []
-            for i, hint in enumerate(hints):
-                ttk.Label(hints_frame, text=f"Hint {i+1}:").grid(row=i, column=0, sticky=tk.W)
-                hint_entry = ttk.Entry(hints_frame)
-                hint_entry.grid(row=i, column=1, sticky=tk.EW)
-                hint_entry.insert(0, hint)
-                hint_entries.append(hint_entry)
-
-            hints_frame.grid_columnconfigure(1, weight=1)
-
-            return answer_entry, hint_entries
-
-        # Add existing cards
-        card_widgets = []
-        for card in deck_data['cards']:
-            card_widgets.append(add_card(card['answer'], card['hints']))
+        # Only the cards on screen get widgets; the rest live in a list
+        card_list = gcpeditor.CardList(cards_frame, deck_data['cards'])
 
         # Add button to add new cards
-        ttk.Button(deck_window, text="Add Card", command=lambda: card_widgets.append(add_card())).pack(pady=10)
+        ttk.Button(deck_window, text="Add Card", command=card_list.add_card).pack(pady=10)
 
         # Save button
         def save_deck():
                 deck_data['name'] = deck_name_entry.get()
                 deck_data['color'] = deck_color_entry.get()
-                deck_data['cards'] = []
-                for answer_entry, hint_entries in card_widgets:
-                    deck_data['cards'].append({
-                        "answer": answer_entry.get(),
-                        "hints": [hint.get() for hint in hint_entries]
-                    })
-                with open(deck_path, 'w') as f:
-                    json.dump(deck_data, f, indent=2)
+                deck_data['cards'] = card_list.get_cards()
+                self.assets.put('deck', deck_id, json.dumps(deck_data, indent=2).encode())
+                if self.current_gcp_path:
+                    self.indexer.submit(
+                        self.search_index.index_deck, self.current_gcp_path, self.pack_id_entry.get(),
+                        deck_id, deck_data['name'], deck_data['cards'])
                 
                 # Update main treeview
                 for item in self.decks_tree.get_children():
                     if self.decks_tree.item(item, "values")[1] == deck_id:
-                        self.decks_tree.item(item, values=('', deck_id, deck_data['name'], deck_data['color'], self.decks_tree.item(item, "values")[4], 'Edit'))
+                        self.decks_tree.item(item, values=('', deck_id, deck_data['name'], deck_data['color'], self.decks_tree.item(item, "values")[4], 'Edit'),
+                                             tags=(self.color_tag(deck_data['color']),))
                         break
                 
                 deck_window.destroy()
@@ -650,78 +805,46 @@ class GCPStudio:
         ttk.Button(deck_window, text="Save Deck", command=save_deck).pack(pady=10)
 
         # Pack the canvas and scrollbar
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-
-    def compress_pack(self, folder_path, output_path):
-        # Create a temporary working directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Copy the entire pack structure to the temp directory
-            temp_pack_dir = os.path.join(temp_dir, os.path.basename(folder_path))
-            shutil.copytree(folder_path, temp_pack_dir)
-            
-            # Process deck folder
-            deck_path = os.path.join(temp_pack_dir, "deck")
-            for file in os.listdir(deck_path):
-                if file.endswith(".json"):
-                    file_path = os.path.join(deck_path, file)
-                    self.shift_bits(file_path, shift_up=True)
-                    os.rename(file_path, file_path[:-5] + ".gcd")
-            
-            with zipfile.ZipFile(os.path.join(temp_pack_dir, "deck.gcdp"), 'w') as zipf:
-                for root, _, files in os.walk(deck_path):
-                    for file in files:
-                        zipf.write(os.path.join(root, file), file)
-            
-            # Process image folder
-            image_path = os.path.join(temp_pack_dir, "image")
-            for file in os.listdir(image_path):
-                if file.endswith(".png"):
-                    file_path = os.path.join(image_path, file)
-                    os.rename(file_path, file_path[:-4] + ".gci")
-            
-            with zipfile.ZipFile(os.path.join(temp_pack_dir, "image.gcip"), 'w') as zipf:
-                for root, _, files in os.walk(image_path):
-                    for file in files:
-                        zipf.write(os.path.join(root, file), file)
-
-            # Process sound folder
-            sound_path = os.path.join(temp_pack_dir, "sound")
-            for file in os.listdir(sound_path):
-                if file.endswith(".m4a"):
-                    file_path = os.path.join(sound_path, file)
-                    os.rename(file_path, file_path[:-4] + ".gcs")
-            
-            with zipfile.ZipFile(os.path.join(temp_pack_dir, "sound.gcsp"), 'w') as zipf:
-                for root, _, files in os.walk(sound_path):
-                    for file in files:
-                        zipf.write(os.path.join(root, file), file)
-            
-            # Delete temporary deck and image and sound folders
-            shutil.rmtree(deck_path)
-            shutil.rmtree(image_path)
-            shutil.rmtree(sound_path)
-            
-            # Create final ZIP archive
-            with zipfile.ZipFile(output_path, 'w') as zipf:
-                zipf.write(os.path.join(temp_pack_dir, "info.json"), "info.json")
-                zipf.write(os.path.join(temp_pack_dir, "deck.gcdp"), "deck.gcdp")
-                zipf.write(os.path.join(temp_pack_dir, "image.gcip"), "image.gcip")
-                zipf.write(os.path.join(temp_pack_dir, "sound.gcsp"), "sound.gcsp")
-
-    def shift_bits(self, file_path, shift_up=True):
-        with open(file_path, 'rb') as file:
-            data = bytearray(file.read())
-        
-        for i in range(len(data)):
-            if shift_up:
-                data[i] = (data[i] << 1) & 255
-            else:
-                data[i] = (data[i] >> 1) & 255
-        
-        with open(file_path, 'wb') as file:
-            file.write(data)
+        card_list.canvas.pack(side="left", fill="both", expand=True)
+        card_list.scrollbar.pack(side="right", fill="y")
+
+    def show_stats(self):
+        # Aggregated timing spans of this session (see gcptrace)
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title("Stats")
+        stats_window.geometry('700x350')
+
+        if not gcptrace.ENABLED:
+            ttk.Label(stats_window, text="Tracing is off. Start GCP Studio with GCP_TRACE=1 (or GCP_TRACE=<file>) to collect stats.").pack(padx=10, pady=10)
+            return
 
+        columns = ('Span', 'Count', 'Total ms', 'Avg ms', 'Max ms', 'MB', 'Items')
+        stats_tree = ttk.Treeview(stats_window, columns=columns, show='headings')
+        for column in columns:
+            stats_tree.heading(column, text=column)
+            stats_tree.column(column, width=70, anchor='e')
+        stats_tree.column('Span', width=180, anchor='w')
+        stats_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        def refresh():
+            stats_tree.delete(*stats_tree.get_children())
+            for name, entry in gcptrace.stats().items():
+                stats_tree.insert('', 'end', values=(
+                    name, entry['count'], f"{entry['total'] * 1000:.1f}", f"{entry['total'] * 1000 / entry['count']:.1f}",
+                    f"{entry['max'] * 1000:.1f}", f"{entry['bytes'] / (1024 * 1024):.2f}", entry['items']))
+
+        def reset():
+            gcptrace.reset()
+            refresh()
+
+        buttons = ttk.Frame(stats_window)
+        buttons.pack(pady=(0, 10))
+        ttk.Button(buttons, text="Refresh", command=refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Reset", command=reset).pack(side=tk.LEFT, padx=5)
+        refresh()
+
+    def layout_version(self):
+        return 2 if self.flat_layout.get() else 1
 
 if __name__ == "__main__":
     root = customtkinter.CTk()
@@ -0,0 +1,127 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+# Tracing is off unless GCP_TRACE is set: GCP_TRACE=1 keeps in-app stats
+# only, GCP_TRACE=<file> also appends every span to that file, as a Chrome
+# trace (chrome://tracing, Perfetto) when it ends in .json and as JSON lines
+# otherwise. Worker processes inherit the variable and append to the same
+# file. When off, span() hands back a shared no-op object.
+TRACE = os.getenv('GCP_TRACE', '')
+ENABLED = bool(TRACE) and TRACE != '0'
+TRACE_PATH = TRACE if ENABLED and TRACE != '1' else None
+
+_lock = threading.Lock()
+_file = None
+_stats = {}
+# perf_counter() and wall time at import, to place spans on one timeline
+_origin = (time.perf_counter(), time.time())
+
+
+class Span:
+    __slots__ = ('name', 'fields', 'start')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        record(self.name, self.start, duration, self.fields)
+
+    def add(self, **counts):
+        # Accumulate counts (bytes=..., items=...) while the span is open
+        for key, value in counts.items():
+            self.fields[key] = self.fields.get(key, 0) + value
+
+    def end(self):
+        self.__exit__(None, None, None)
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def add(self, **counts):
+        pass
+
+    def end(self):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name, **fields):
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name, fields)
+
+
+def begin(name, **fields):
+    # A span that outlives one block, e.g. from a request to its callback;
+    # close it with end()
+    return span(name, **fields).__enter__()
+
+
+def record(name, start, duration, fields):
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'bytes': 0, 'items': 0}
+        entry['count'] += 1
+        entry['total'] += duration
+        entry['max'] = max(entry['max'], duration)
+        entry['bytes'] += fields.get('bytes', 0)
+        entry['items'] += fields.get('items', 0)
+        if TRACE_PATH:
+            write_event(name, start, duration, fields)
+
+
+def write_event(name, start, duration, fields):
+    global _file
+    if _file is None:
+        _file = open(TRACE_PATH, 'a', buffering=1)
+        atexit.register(_file.close)
+        if TRACE_PATH.endswith('.json') and _file.tell() == 0:
+            # Chrome's array format allows the trailing comma and no "]"
+            _file.write('[\n')
+    timestamp = _origin[1] + (start - _origin[0])
+    if TRACE_PATH.endswith('.json'):
+        event = {
+            'name': name, 'ph': 'X', 'ts': int(timestamp * 1e6), 'dur': int(duration * 1e6),
+            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': fields,
+        }
+        _file.write(json.dumps(event, default=str) + ',\n')
+    else:
+        event = {
+            'name': name, 'time': timestamp, 'duration_ms': duration * 1000,
+            'pid': os.getpid(), 'thread': threading.current_thread().name, **fields,
+        }
+        _file.write(json.dumps(event, default=str) + '\n')
+
+
+def stats():
+    # {name: {count, total, max, bytes, items}} for this process, slowest first
+    with _lock:
+        items = sorted(_stats.items(), key=lambda item: item[1]['total'], reverse=True)
+        return {name: dict(entry) for name, entry in items}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,36 @@
+import ast
+import os
+import sys
+import zipfile
+
+# Bundle gcpstudio.py with every gcp*.py module it imports, for the site's
+# download button: python scripts/studio_zip.py (run by npm's prebuild)
+PUBLIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'public')
+
+
+def modules(name, found=None):
+    # name plus the sibling modules it imports, directly or not
+    found = found if found is not None else []
+    found.append(name)
+    with open(os.path.join(PUBLIC_DIR, name + '.py'), 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        names = [alias.name for alias in node.names] if isinstance(node, ast.Import) else \
+            [node.module] if isinstance(node, ast.ImportFrom) and node.module else []
+        for module in names:
+            if module not in found and os.path.exists(os.path.join(PUBLIC_DIR, module + '.py')):
+                modules(module, found)
+    return found
+
+
+def main():
+    output_path = os.path.join(PUBLIC_DIR, 'gcpstudio.zip')
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for name in modules('gcpstudio'):
+            zipf.write(os.path.join(PUBLIC_DIR, name + '.py'), name + '.py')
+    print(f"Wrote {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
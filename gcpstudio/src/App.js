@@ -12,8 +12,10 @@ const App = () => {
   const [copyWindows, setCopyWindows] = useState(false);
   const [copyLinux, setCopyLinux] = useState(false);
 
-  const windowsCommand = 'curl -o gcpstudio.py https://fayaz.one/gcpstudio/gcpstudio.py && python gcpstudio.py';
-  const macCommand = 'curl -O https://fayaz.one/gcpstudio/gcpstudio.py && python3 gcpstudio.py';
+  // gcpstudio.py imports the gcp*.py modules next to it, so fetch them all
+  const scriptsUrl = 'https://fayaz.one/gcpstudio/{gcpstudio,gcpcodec,gcpblobs,gcptrace,gcppack,gcpcache,gcploader,gcpdownload,gcpaudio,gcpcore,gcpsearch,gcpeditor}.py';
+  const windowsCommand = `curl --remote-name-all "${scriptsUrl}" && python gcpstudio.py`;
+  const macCommand = `curl --remote-name-all "${scriptsUrl}" && python3 gcpstudio.py`;
 
 
   useEffect(() => {
@@ -179,13 +181,13 @@ const App = () => {
               </div>
             </div>
             <div className="text-center mt-6">
-            <p className="mb-4">Alternatively, use the button below to download the Python script.</p>
+            <p className="mb-4">Alternatively, use the button below to download the Python scripts as a zip. Extract it and run gcpstudio.py.</p>
               <a
-                href="https://fayaz.one/gcpstudio/gcpstudio.py"
-                download="gcpstudio.py"
+                href="https://fayaz.one/gcpstudio/gcpstudio.zip"
+                download="gcpstudio.zip"
                 className="bg-green-500 hover:bg-green-700 text-white font-bold py-2 px-4 rounded"
               >
-                Download Python Script
+                Download Python Scripts
               </a>
             </div>
           </div>
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The studio's modules live next to gcpstudio.py in the site's public folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gcpstudio', 'public'))
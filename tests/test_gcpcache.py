@@ -0,0 +1,30 @@
+import io
+
+import pytest
+from PIL import Image
+
+import gcpcache
+
+
+def encode(image, format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **image.info)
+    return buffer.getvalue()
+
+
+def transparent_palette():
+    image = Image.new('P', (300, 200))
+    image.info['transparency'] = 0
+    return image
+
+
+@pytest.mark.parametrize('image, format, mode, pixel', [
+    (Image.new('I;16', (300, 200), 40000), 'PNG', 'RGB', (156, 156, 156, 255)),
+    (Image.new('CMYK', (300, 200), (0, 0, 0, 0)), 'JPEG', 'RGB', (255, 255, 255, 255)),
+    (transparent_palette(), 'PNG', 'RGBA', (0, 0, 0, 0)),
+], ids=['16-bit', 'cmyk', 'transparent-palette'])
+def test_render_thumbnail_handles_image_modes(image, format, mode, pixel):
+    thumbnail = Image.open(io.BytesIO(gcpcache.render_thumbnail(encode(image, format))))
+    assert thumbnail.size == gcpcache.THUMBNAIL_SIZE
+    assert thumbnail.mode == mode
+    assert thumbnail.convert('RGBA').getpixel((0, 0)) == pixel
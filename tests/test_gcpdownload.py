@@ -0,0 +1,209 @@
+import hashlib
+import os
+
+import pytest
+import requests
+
+import gcpbench
+import gcpdownload
+
+
+class RangeHandler(gcpbench.QuietHandler):
+    # Static files with a strong ETag, conditional GETs and single byte
+    # ranges. server.cut makes the next full response stop after that many
+    # bytes and drop the connection.
+    def do_GET(self):
+        with open(self.translate_path(self.path), 'rb') as f:
+            data = f.read()
+        etag = '"{}"'.format(hashlib.sha256(data).hexdigest()[:16])
+        self.server.requests.append(dict(self.headers))
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        status, body = 200, data
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range', etag) == etag:
+            start = int(range_header[len('bytes='):].split('-')[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(data)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status, body = 206, data[start:]
+
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {len(data) - len(body)}-{len(data) - 1}/{len(data)}')
+        cut, self.server.cut = self.server.cut, None
+        if cut is not None:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body[:cut] if cut is not None else body)
+
+
+@pytest.fixture
+def server(tmp_path):
+    www = tmp_path / 'www'
+    www.mkdir()
+    server = gcpbench.serve(str(www), RangeHandler)
+    server.requests = []
+    server.cut = None
+    server.www = www
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session():
+    session = gcpdownload.make_session()
+    yield session
+    session.close()
+
+
+def publish(server, name, data):
+    (server.www / name).write_bytes(data)
+    return f"{server.url}/{name}"
+
+
+def pack_bytes(size=300 * 1024, seed=b'a'):
+    return (seed * 97 + bytes(range(256))) * (size // (97 + 256))
+
+
+def test_download_verifies_and_caches(server, session, tmp_path):
+    data = pack_bytes()
+    url = publish(server, 'pack.gcp', data)
+    cache = gcpdownload.DownloadCache(str(tmp_path / 'cache'))
+    dest = str(tmp_path / 'pack.gcp')
+
+    gcpdownload.download_file(session, url, dest, cache=cache, size=len(data), sha256=hashlib.sha256(data).hexdigest())
+
+    with open(dest, 'rb') as f:
+        assert f.read() == data
+    assert not os.path.exists(dest + '.part')
+    assert cache.entries[url]['sha256'] == hashlib.sha256(data).hexdigest()
+
+
+def test_unchanged_file_is_revalidated_with_304(server, session, tmp_path):
+    data = pack_bytes()
+    url = publish(server, 'pack.gcp', data)
+    cache = gcpdownload.DownloadCache(str(tmp_path / 'cache'))
+    dest = str(tmp_path / 'pack.gcp')
+    gcpdownload.download_file(session, url, dest, cache=cache)
+    mtime = os.path.getmtime(dest)
+
+    gcpdownload.download_file(session, url, dest, cache=cache)
+
+    assert 'If-None-Match' in server.requests[-1]
+    assert os.path.getmtime(dest) == mtime
+
+
+def test_locally_modified_file_is_fetched_again(server, session, tmp_path):
+    data = pack_bytes()
+    url = publish(server, 'pack.gcp', data)
+    cache = gcpdownload.DownloadCache(str(tmp_path / 'cache'))
+    dest = str(tmp_path / 'pack.gcp')
+    gcpdownload.download_file(session, url, dest, cache=cache)
+    with open(dest, 'r+b') as f:
+        f.write(b'x')
+
+    gcpdownload.download_file(session, url, dest, cache=cache)
+
+    assert 'If-None-Match' not in server.requests[-1]
+    with open(dest, 'rb') as f:
+        assert f.read() == data
+
+
+def test_interrupted_download_resumes_with_range(server, session, tmp_path):
+    data = pack_bytes()
+    url = publish(server, 'pack.gcp', data)
+    cache = gcpdownload.DownloadCache(str(tmp_path / 'cache'))
+    dest = str(tmp_path / 'pack.gcp')
+    server.cut = len(data) // 3
+
+    gcpdownload.download_file(session, url, dest, cache=cache, size=len(data), sha256=hashlib.sha256(data).hexdigest())
+
+    # Only whole chunks reach the .part, so the range starts at or before the cut
+    assert len(server.requests) == 2
+    offset = int(server.requests[1]['Range'][len('bytes='):-1])
+    assert 0 < offset <= len(data) // 3
+    # Validated against the ETag the interrupted response carried
+    assert server.requests[1]['If-Range'] == '"{}"'.format(hashlib.sha256(data).hexdigest()[:16])
+    with open(dest, 'rb') as f:
+        assert f.read() == data
+
+
+def test_resume_restarts_when_the_file_changed(server, session, tmp_path):
+    old, new = pack_bytes(seed=b'a'), pack_bytes(seed=b'b')
+    url = publish(server, 'pack.gcp', old)
+    cache = gcpdownload.DownloadCache(str(tmp_path / 'cache'))
+    dest = str(tmp_path / 'pack.gcp')
+    server.cut = len(old) // 2
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        # One attempt, without download_file's retries
+        gcpdownload.fetch_part(session, url, dest, dest + '.part', None, cache, None, None, None)
+    offset = os.path.getsize(dest + '.part')
+    publish(server, 'pack.gcp', new)
+
+    gcpdownload.download_file(session, url, dest, cache=cache)
+
+    # If-Range no longer matches, so the server sends the whole new file
+    assert server.requests[-1]['Range'] == f'bytes={offset}-'
+    with open(dest, 'rb') as f:
+        assert f.read() == new
+
+
+def test_stale_partial_gets_416_and_starts_over(server, session, tmp_path):
+    data = pack_bytes()
+    url = publish(server, 'pack.gcp', data)
+    dest = str(tmp_path / 'pack.gcp')
+    with open(dest + '.part', 'wb') as f:
+        f.write(b'x' * (len(data) + 10))
+
+    gcpdownload.download_file(session, url, dest)
+
+    assert 'Range' in server.requests[0] and 'Range' not in server.requests[1]
+    with open(dest, 'rb') as f:
+        assert f.read() == data
+
+
+def test_hash_mismatch_leaves_nothing_behind(server, session, tmp_path):
+    data = pack_bytes()
+    url = publish(server, 'pack.gcp', data)
+    dest = str(tmp_path / 'pack.gcp')
+
+    with pytest.raises(ValueError):
+        gcpdownload.download_file(session, url, dest, sha256=hashlib.sha256(b'other').hexdigest())
+
+    assert not os.path.exists(dest)
+    assert not os.path.exists(dest + '.part')
+
+
+def test_size_mismatch_is_rejected(server, session, tmp_path):
+    data = pack_bytes()
+    url = publish(server, 'pack.gcp', data)
+    dest = str(tmp_path / 'pack.gcp')
+
+    with pytest.raises(ValueError):
+        gcpdownload.download_file(session, url, dest, size=len(data) + 1)
+    assert not os.path.exists(dest)
+
+
+def test_matching_local_copy_is_not_fetched(server, session, tmp_path):
+    data = pack_bytes()
+    url = publish(server, 'pack.gcp', data)
+    dest = tmp_path / 'pack.gcp'
+    dest.write_bytes(data)
+
+    gcpdownload.download_file(session, url, str(dest), sha256=hashlib.sha256(data).hexdigest())
+
+    assert server.requests == []
@@ -0,0 +1,117 @@
+import os
+import stat
+import sys
+import zipfile
+
+import pytest
+
+import gcpcore
+import gcppack
+
+PACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'packs')
+
+
+def write_pack(path):
+    with gcppack.PackWriter(str(path)) as writer:
+        writer.add('deck', 'd', b'{"cards": []}')
+        writer.write({'id': 'p', 'name': 'P', 'cards': []})
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="POSIX modes")
+def test_written_pack_gets_the_usual_file_mode(tmp_path):
+    write_pack(tmp_path / 'new.gcp')
+    assert stat.S_IMODE(os.stat(tmp_path / 'new.gcp').st_mode) == 0o666 & ~gcppack.UMASK
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="POSIX modes")
+def test_rewritten_pack_keeps_its_mode(tmp_path):
+    path = tmp_path / 'pack.gcp'
+    write_pack(path)
+    os.chmod(path, 0o640)
+    write_pack(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+def test_reader_close_reports_a_map_still_in_use(tmp_path):
+    write_pack(tmp_path / 'pack.gcp')
+    reader = gcppack.PackReader(str(tmp_path / 'pack.gcp'))
+    view = memoryview(reader.mmap)
+    assert reader.close() is False
+    view.release()
+    assert gcppack.PackReader(str(tmp_path / 'pack.gcp')).close() is True
+
+
+@pytest.mark.parametrize('raw', [True, False], ids=['raw', 'recompressed'])
+@pytest.mark.parametrize('version', [1, 2])
+@pytest.mark.parametrize('compression', ['stored', 'balanced', 'smallest'])
+def test_save_copies_unchanged_members(tmp_path, monkeypatch, compression, version, raw):
+    copies = []
+    write_raw = gcppack.write_raw
+    monkeypatch.setattr(gcppack, 'write_raw', lambda zipf, zinfo, data: copies.append(zinfo.filename) or write_raw(zipf, zinfo, data))
+    if not raw:
+        monkeypatch.setattr(gcppack, 'can_write_raw', lambda zipf: False)
+    # A source compressed the way the copy will be, so its members qualify
+    source_path = str(tmp_path / 'source.gcp')
+    gcpcore.save(gcpcore.load(os.path.join(PACKS_DIR, 'misc.gcp')), source_path, compression, version)
+
+    # One deck is re-encoded, so v1 copies the deck archive member by
+    # member and the image and sound archives whole
+    source = gcppack.PackReader(source_path)
+    pack = gcpcore.load(source_path)
+    for deck in pack.decks:
+        deck.unchanged = tuple(gcppack.LAYOUT)
+    pack.decks[0].unchanged = ('image', 'sound')
+    pack.decks[0].cards = pack.decks[0].cards[:1]
+    output_path = str(tmp_path / 'output.gcp')
+    try:
+        gcpcore.save(pack, output_path, compression, version, source=source)
+    finally:
+        source.close()
+
+    assert bool(copies) == raw
+    if raw:
+        # Unchanged decks went across member by member
+        assert any(name.endswith(gcppack.LAYOUT['deck'][1]) for name in copies)
+    if raw and version == 1 and compression != 'smallest':
+        # ('smallest' takes over only deflated members; stored ones are
+        # measured again)
+        assert {'deck.gcdp', 'image.gcip', 'sound.gcsp'} & set(copies) == {'image.gcip', 'sound.gcsp'}
+    for deck in pack.decks:
+        deck.unchanged = ()
+    assert gcpcore.load(output_path) == pack
+    reader = gcppack.PackReader(output_path)
+    try:
+        assert reader.zipf.testzip() is None
+        for kind in gcppack.LAYOUT:
+            archive = reader.archive(kind)
+            assert archive.testzip() is None
+            compress_type = gcppack.COMPRESSION[compression][kind][0]
+            allowed = {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED} if compress_type == gcppack.ZIP_SMALLER else {compress_type}
+            assert all(archive.getinfo(name).compress_type in allowed for name in reader.members[kind].values())
+    finally:
+        reader.close()
+
+
+@pytest.mark.parametrize('name', sorted(os.listdir(PACKS_DIR)))
+def test_smallest_is_never_larger_than_balanced(tmp_path, name):
+    pack = gcpcore.load(os.path.join(PACKS_DIR, name))
+    gcpcore.save(pack, str(tmp_path / 'balanced.gcp'), 'balanced')
+    gcpcore.save(pack, str(tmp_path / 'smallest.gcp'), 'smallest')
+    assert os.path.getsize(tmp_path / 'smallest.gcp') <= os.path.getsize(tmp_path / 'balanced.gcp')
+
+
+@pytest.mark.parametrize('data', [b'not a zip', None], ids=['not-a-zip', 'no-info'])
+def test_reader_that_fails_to_open_releases_the_file(tmp_path, monkeypatch, data):
+    path = tmp_path / 'broken.gcp'
+    if data is None:
+        with zipfile.ZipFile(path, 'w') as zipf:
+            zipf.writestr('other.json', '{}')
+    else:
+        path.write_bytes(data)
+    closed = []
+    close = gcppack.PackReader.close
+    monkeypatch.setattr(gcppack.PackReader, 'close', lambda self: closed.append(close(self)) or closed[-1])
+    with pytest.raises((zipfile.BadZipFile, FileNotFoundError)):
+        gcppack.PackReader(str(path))
+    # Unmapped, not left waiting on a view
+    assert closed == [True]
@@ -0,0 +1,23 @@
+import json
+import os
+import shutil
+
+import gcpdownload
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def test_packstore_matches_packs():
+    # Clients reject packs that fail the pinned size/sha256; after changing
+    # packs/, run: python gcpstudio/public/gcpdownload.py packstore.json
+    assert gcpdownload.stale_packs(os.path.join(REPO_DIR, 'packstore.json')) == []
+
+
+def test_changed_pack_is_reported(tmp_path):
+    shutil.copytree(os.path.join(REPO_DIR, 'packs'), tmp_path / 'packs')
+    shutil.copyfile(os.path.join(REPO_DIR, 'packstore.json'), tmp_path / 'packstore.json')
+    pack_id = json.loads((tmp_path / 'packstore.json').read_text())['packs'][0]['id']
+    with open(tmp_path / 'packs' / f"{pack_id}.gcp", 'ab') as f:
+        f.write(b'\0')
+
+    assert gcpdownload.stale_packs(str(tmp_path / 'packstore.json')) == [pack_id]